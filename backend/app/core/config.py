@@ -40,6 +40,8 @@ class Settings(BaseSettings):
     # RAG
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
     EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
+    # Backend modelu embeddingów metryk TRACe: torch | onnx-int8 (wymaga optimum[onnxruntime])
+    TRACE_EMBEDDING_BACKEND: str = os.getenv("TRACE_EMBEDDING_BACKEND", "torch")
     # Keep for compatibility with components expecting a local vector path
     VECTOR_DB_PATH: str = os.getenv("VECTOR_DB_PATH", "./vector_db")
 
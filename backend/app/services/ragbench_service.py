@@ -6,8 +6,8 @@ Obsługuje import korpusów, testowanie strategii RAG oraz obliczanie metryk TRA
 import logging
 import json
 import requests
-from typing import Dict, List, Any, Optional, Tuple
-from dataclasses import dataclass
+from typing import Dict, List, Any, Optional, Tuple, ClassVar
+from dataclasses import dataclass, fields
 from datetime import datetime
 import numpy as np
 
@@ -19,6 +19,9 @@ from app.rag.factory import RAGPolicyFactory
 
 logger = logging.getLogger(__name__)
 
+# Kolejność metryk TRACe w obliczeniach wektorowych
+TRACE_METRIC_NAMES = ("adherence", "completeness", "utilization", "relevance")
+
 
 @dataclass
 class RAGBenchQuery:
@@ -32,18 +35,42 @@ class RAGBenchQuery:
     metadata: Dict[str, Any]
 
 
-@dataclass
+@dataclass(eq=False)
 class RAGBenchResult:
     """Reprezentuje wynik testu RAGBench"""
+    METRIC_NAMES: ClassVar[Tuple[str, ...]] = TRACE_METRIC_NAMES
+    
     query_id: str
     strategy: str
     response: str
     context_used: List[str]
-    metrics: Dict[str, float]
+    metrics: np.ndarray  # Wektor float32 w kolejności METRIC_NAMES
     latency: float
     tokens: int
     cost: float
     timestamp: datetime
+    
+    def __post_init__(self):
+        # Metryki mogą zostać przekazane jako słownik (np. wynik TRACEService)
+        if isinstance(self.metrics, dict):
+            self.metrics = np.array(
+                [self.metrics.get(name, 0.0) for name in self.METRIC_NAMES], dtype=np.float32
+            )
+    
+    def __eq__(self, other):
+        # Wygenerowane __eq__ porównywałoby tablice numpy operatorem == (niejednoznaczna wartość logiczna)
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return all(
+            np.array_equal(getattr(self, f.name), getattr(other, f.name)) if f.name == "metrics"
+            else getattr(self, f.name) == getattr(other, f.name)
+            for f in fields(self)
+        )
+    
+    @property
+    def metrics_dict(self) -> Dict[str, float]:
+        """Metryki jako słownik nazwa -> wartość"""
+        return dict(zip(self.METRIC_NAMES, self.metrics.tolist()))
 
 
 class RAGBenchService:
@@ -444,33 +471,24 @@ class RAGBenchService:
         if not results:
             return {}
         
-        total_adherence = sum(r.metrics.get("adherence", 0) for r in results)
-        total_completeness = sum(r.metrics.get("completeness", 0) for r in results)
-        total_utilization = sum(r.metrics.get("utilization", 0) for r in results)
-        total_relevance = sum(r.metrics.get("relevance", 0) for r in results)
-        total_tokens = sum(r.tokens for r in results)
-        total_cost = sum(r.cost for r in results)
+        # Macierz (wyniki x metryki) - średnie liczone jedną redukcją po kolumnach
+        metrics_matrix = np.stack([r.metrics for r in results])
+        averages = dict(zip(RAGBenchResult.METRIC_NAMES, metrics_matrix.mean(axis=0, dtype=np.float64).tolist()))
         
         count = len(results)
+        averages["tokens"] = sum(r.tokens for r in results) / count
+        averages["cost"] = sum(r.cost for r in results) / count
         
-        return {
-            "adherence": total_adherence / count,
-            "completeness": total_completeness / count,
-            "utilization": total_utilization / count,
-            "relevance": total_relevance / count,
-            "tokens": total_tokens / count,
-            "cost": total_cost / count
-        }
+        return averages
     
     def _calculate_p95_latency(self, results: List[RAGBenchResult]) -> float:
         """Oblicza 95 percentyl latencji"""
         if not results:
             return 0.0
         
-        latencies = [r.latency for r in results]
-        latencies.sort()
-        p95_index = int(len(latencies) * 0.95)
-        return latencies[p95_index] if p95_index < len(latencies) else latencies[-1]
+        # Selekcja (introselect) zamiast pełnego sortowania listy latencji
+        latencies = np.fromiter((r.latency for r in results), dtype=np.float64, count=len(results))
+        return float(np.percentile(latencies, 95, method="nearest"))
     
     def _generate_recommendations(self, domains_stats: Dict[str, Dict[str, Dict[str, Any]]]) -> List[str]:
         """Generuje rekomendacje na podstawie statystyk"""
@@ -3,25 +3,111 @@ TRACe Service - implementacja metryk TRACe dla oceny systemów RAG
 Metryki: Relevance, Utilization, Adherence, Completeness
 """
 
+import hashlib
 import logging
 import re
+from collections import OrderedDict
+from functools import lru_cache
 from typing import Dict, List, Any, Optional, Tuple
 import numpy as np
 from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
+
+try:
+    from optimum.onnxruntime import ORTModelForFeatureExtraction
+    from transformers import AutoTokenizer
+except ImportError:
+    ORTModelForFeatureExtraction = None
+
+from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Nazwy metryk TRACe w kolejności zwracanej przez serwis
+TRACE_METRICS = ("relevance", "utilization", "adherence", "completeness")
+_ZERO_METRICS = dict.fromkeys(TRACE_METRICS, 0.0)
+
+# Maksymalna liczba embeddingów przechowywanych w pamięci podręcznej serwisu
+EMBEDDING_CACHE_SIZE = 10000
+
+# Koniec zdania: znaki [.!?] przed białym znakiem lub końcem tekstu (nie dzieli "1.8")
+_SENTENCE_END_RE = re.compile(r'[.!?]+(?=\s|$)\s*')
+
+
+@lru_cache(maxsize=4096)
+def _split_sentences_cached(text: str) -> Tuple[str, ...]:
+    """Dzieli tekst na zdania; wynik jest zapamiętywany dla powtarzających się tekstów"""
+    return tuple(s.strip() for s in _SENTENCE_END_RE.split(text) if s.strip())
+
+
+# Token to ciąg znaków alfanumerycznych (interpunkcja nie wchodzi do tokenów)
+_TOKEN_RE = re.compile(r'\w+')
+
+
+@lru_cache(maxsize=4096)
+def _token_set(text: str) -> frozenset:
+    """Zbiór tokenów tekstu (małe litery); wynik jest zapamiętywany dla powtarzających się tekstów"""
+    return frozenset(_TOKEN_RE.findall(text.lower()))
+
+
+class QuantizedEmbeddingModel:
+    """
+    Model all-MiniLM-L6-v2 skwantyzowany do int8 (ONNX Runtime) dla ścieżki CPU
+    
+    Udostępnia ten sam interfejs encode co SentenceTransformer: mean pooling
+    po tokenach z maską uwagi i opcjonalna normalizacja L2.
+    """
+    
+    MODEL_ID = "sentence-transformers/all-MiniLM-L6-v2"
+    ONNX_FILE_NAME = "model_qint8_avx512_vnni.onnx"
+    MAX_LENGTH = 256
+    
+    def __init__(self):
+        self.tokenizer = AutoTokenizer.from_pretrained(self.MODEL_ID)
+        self.model = ORTModelForFeatureExtraction.from_pretrained(
+            self.MODEL_ID, subfolder="onnx", file_name=self.ONNX_FILE_NAME
+        )
+    
+    def encode(self, texts: List[str], batch_size: int = 64, convert_to_numpy: bool = True,
+               normalize_embeddings: bool = False) -> np.ndarray:
+        """Koduje teksty wsadami; zwraca macierz embeddingów (n x d)"""
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            inputs = self.tokenizer(
+                texts[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.MAX_LENGTH,
+                return_tensors="np"
+            )
+            token_embeddings = self.model(**inputs).last_hidden_state
+            
+            # Mean pooling z pominięciem tokenów dopełnienia
+            mask = inputs["attention_mask"][..., None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            batches.append(pooled.astype(np.float32))
+        
+        embeddings = np.concatenate(batches) if batches else np.zeros((0, 0), dtype=np.float32)
+        if normalize_embeddings and len(embeddings):
+            embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return embeddings
+
 
 class TRACEService:
     """Serwis do obliczania metryk TRACe"""
     
     def __init__(self):
         self.embedding_model = None
+        self._embedding_cache: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._embedding_cache_model = None
         self._initialize_embedding_model()
     
     def _initialize_embedding_model(self):
         """Inicjalizuje model embeddingów dla obliczania podobieństwa semantycznego"""
+        if settings.TRACE_EMBEDDING_BACKEND == "onnx-int8":
+            self.embedding_model = self._load_quantized_model()
+            if self.embedding_model:
+                return
+        
         try:
             self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
             logger.info("Model embeddingów zainicjalizowany dla TRACe")
@@ -29,6 +115,20 @@ class TRACEService:
             logger.warning(f"Nie udało się załadować modelu embeddingów: {e}")
             self.embedding_model = None
     
+    def _load_quantized_model(self) -> Optional[QuantizedEmbeddingModel]:
+        """Ładuje model int8 (ONNX); None gdy optimum/onnxruntime nie są dostępne"""
+        if ORTModelForFeatureExtraction is None:
+            logger.warning("optimum[onnxruntime] nie jest zainstalowane - używam modelu PyTorch")
+            return None
+        
+        try:
+            model = QuantizedEmbeddingModel()
+            logger.info("Model embeddingów int8 (ONNX) zainicjalizowany dla TRACe")
+            return model
+        except Exception as e:
+            logger.warning(f"Nie udało się załadować modelu int8 (ONNX): {e}")
+            return None
+    
     def calculate_metrics(self, query: str, response: str, context: Dict[str, Any], 
                          ground_truth: List[str]) -> Dict[str, float]:
         """
@@ -43,18 +143,29 @@ class TRACEService:
         Returns:
             Słownik z metrykami TRACe
         """
+        # Każda metryka porównuje odpowiedź - bez odpowiedzi wszystkie są zerowe
+        if not response:
+            return dict(_ZERO_METRICS)
+        
         try:
+            # Wszystkie teksty potrzebne metrykom kodujemy jednym wywołaniem modelu
+            embeddings = None
+            if self.embedding_model:
+                embeddings = self._embed_texts(
+                    self._collect_metric_texts(query, response, context, ground_truth)
+                )
+            
             # Relevance - trafność odpowiedzi względem pytania
-            relevance = self._calculate_relevance(query, response)
+            relevance = self._calculate_relevance(query, response, embeddings)
             
             # Utilization - wykorzystanie kontekstu
-            utilization = self._calculate_utilization(response, context)
+            utilization = self._calculate_utilization(response, context, embeddings)
             
             # Adherence - zgodność z kontekstem (faithfulness)
-            adherence = self._calculate_adherence(response, context)
+            adherence = self._calculate_adherence(response, context, embeddings)
             
             # Completeness - kompletność odpowiedzi
-            completeness = self._calculate_completeness(response, ground_truth)
+            completeness = self._calculate_completeness(response, ground_truth, embeddings)
             
             return {
                 "relevance": relevance,
@@ -65,20 +176,112 @@ class TRACEService:
             
         except Exception as e:
             logger.error(f"Błąd obliczania metryk TRACe: {e}")
-            return {
-                "relevance": 0.0,
-                "utilization": 0.0,
-                "adherence": 0.0,
-                "completeness": 0.0
-            }
+            return dict(_ZERO_METRICS)
     
-    def _calculate_relevance(self, query: str, response: str) -> float:
+    def _collect_metric_texts(self, query: str, response: str, context: Optional[Dict[str, Any]],
+                              ground_truth: Optional[List[str]]) -> List[str]:
+        """
+        Zbiera wszystkie teksty, których embeddingi są potrzebne metrykom TRACe
+        
+        Args:
+            query: Zapytanie użytkownika
+            response: Wygenerowana odpowiedź
+            context: Kontekst wykorzystany do generowania odpowiedzi
+            ground_truth: Prawdziwe odpowiedzi (ground truth)
+            
+        Returns:
+            Lista tekstów (mogą się powtarzać)
+        """
+        texts = [t for t in (query, response) if t]
+        
+        fragments = (context or {}).get("fragments", [])
+        contents = [f.get("content", "") for f in fragments]
+        context_text = " ".join(contents)
+        if context_text:
+            texts.append(context_text)
+        for content in contents:
+            texts.extend(self._split_into_sentences(content))
+        
+        texts.extend(gt for gt in (ground_truth or []) if gt)
+        return texts
+    
+    def _embed_texts(self, texts: List[str]) -> Dict[str, np.ndarray]:
+        """
+        Koduje teksty jednym wsadowym wywołaniem modelu embeddingów
+        
+        Args:
+            texts: Teksty do zakodowania (duplikaty są pomijane)
+            
+        Returns:
+            Słownik tekst -> embedding znormalizowany do długości 1
+        """
+        unique_texts = list(dict.fromkeys(texts))
+        if not unique_texts:
+            return {}
+        
+        # Embeddingi innego modelu nie są porównywalne - zmiana modelu czyści pamięć podręczną
+        if self._embedding_cache_model is not self.embedding_model:
+            self._embedding_cache.clear()
+            self._embedding_cache_model = self.embedding_model
+        
+        result = {}
+        misses = []
+        for text in unique_texts:
+            key = self._cache_key(text)
+            vector = self._embedding_cache.get(key)
+            if vector is None:
+                misses.append(text)
+            else:
+                self._embedding_cache.move_to_end(key)
+                result[text] = vector
+        
+        # Model koduje wyłącznie teksty nieobecne w pamięci podręcznej
+        if misses:
+            vectors = self.embedding_model.encode(
+                misses,
+                batch_size=64,
+                convert_to_numpy=True,
+                normalize_embeddings=True
+            )
+            for text, vector in zip(misses, np.asarray(vectors)):
+                self._remember_embedding(text, vector)
+                result[text] = vector
+        
+        return result
+    
+    @staticmethod
+    def _cache_key(text: str) -> bytes:
+        """Klucz pamięci podręcznej embeddingów - skrót treści tekstu"""
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+    
+    def _remember_embedding(self, text: str, vector: np.ndarray):
+        """Zapisuje embedding w pamięci podręcznej LRU o ograniczonym rozmiarze"""
+        key = self._cache_key(text)
+        self._embedding_cache[key] = vector
+        self._embedding_cache.move_to_end(key)
+        if len(self._embedding_cache) > EMBEDDING_CACHE_SIZE:
+            self._embedding_cache.popitem(last=False)
+    
+    def _get_embeddings(self, texts: List[str],
+                        embeddings: Optional[Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+        """Zwraca embeddingi tekstów, kodując tylko te, których brak w przekazanym słowniku"""
+        if embeddings is not None and all(t in embeddings for t in texts):
+            return embeddings
+        return self._embed_texts(texts)
+    
+    def _stack_embeddings(self, texts: List[str], embeddings: Dict[str, np.ndarray]) -> np.ndarray:
+        """Składa embeddingi tekstów w macierz (n x d) do obliczeń jednym mnożeniem macierzy"""
+        return np.stack([embeddings[t] for t in texts])
+    
+    def _calculate_relevance(self, query: str, response: str,
+                             embeddings: Optional[Dict[str, np.ndarray]] = None) -> float:
         """
         Oblicza relevance - trafność odpowiedzi względem pytania
         
         Args:
             query: Zapytanie użytkownika
             response: Wygenerowana odpowiedź
+            embeddings: Opcjonalne, wcześniej obliczone embeddingi tekstów
             
         Returns:
             Wartość relevance w przedziale [0, 1]
@@ -88,12 +291,13 @@ class TRACEService:
         
         try:
             if self.embedding_model:
-                # Użyj embeddingów semantycznych
-                query_embedding = self.embedding_model.encode([query])
-                response_embedding = self.embedding_model.encode([response])
+                # Identyczne teksty - podobieństwo własne znormalizowanych embeddingów to 1
+                if query == response:
+                    return 1.0
                 
-                similarity = cosine_similarity(query_embedding, response_embedding)[0][0]
-                return float(similarity)
+                # Użyj embeddingów semantycznych (znormalizowanych - cosinus to iloczyn skalarny)
+                embeddings = self._get_embeddings([query, response], embeddings)
+                return float(embeddings[query] @ embeddings[response])
             else:
                 # Fallback na podobieństwo tokenów
                 return self._calculate_token_similarity(query, response)
@@ -102,13 +306,15 @@ class TRACEService:
             logger.error(f"Błąd obliczania relevance: {e}")
             return 0.0
     
-    def _calculate_utilization(self, response: str, context: Dict[str, Any]) -> float:
+    def _calculate_utilization(self, response: str, context: Dict[str, Any],
+                               embeddings: Optional[Dict[str, np.ndarray]] = None) -> float:
         """
         Oblicza utilization - wykorzystanie kontekstu w odpowiedzi
         
         Args:
             response: Wygenerowana odpowiedź
             context: Kontekst wykorzystany do generowania
+            embeddings: Opcjonalne, wcześniej obliczone embeddingi tekstów
             
         Returns:
             Wartość utilization w przedziale [0, 1]
@@ -130,11 +336,8 @@ class TRACEService:
             
             # Oblicz podobieństwo między odpowiedzią a kontekstem
             if self.embedding_model:
-                response_embedding = self.embedding_model.encode([response])
-                context_embedding = self.embedding_model.encode([context_text])
-                
-                similarity = cosine_similarity(response_embedding, context_embedding)[0][0]
-                return float(similarity)
+                embeddings = self._get_embeddings([response, context_text], embeddings)
+                return float(embeddings[response] @ embeddings[context_text])
             else:
                 return self._calculate_token_similarity(response, context_text)
                 
@@ -142,13 +345,15 @@ class TRACEService:
             logger.error(f"Błąd obliczania utilization: {e}")
             return 0.0
     
-    def _calculate_adherence(self, response: str, context: Dict[str, Any]) -> float:
+    def _calculate_adherence(self, response: str, context: Dict[str, Any],
+                             embeddings: Optional[Dict[str, np.ndarray]] = None) -> float:
         """
         Oblicza adherence - zgodność odpowiedzi z kontekstem (faithfulness)
         
         Args:
             response: Wygenerowana odpowiedź
             context: Kontekst wykorzystany do generowania
+            embeddings: Opcjonalne, wcześniej obliczone embeddingi tekstów
             
         Returns:
             Wartość adherence w przedziale [0, 1]
@@ -174,33 +379,27 @@ class TRACEService:
             if not context_sentences:
                 return 0.0
             
-            # Oblicz podobieństwo między odpowiedzią a każdym zdaniem z kontekstu
-            similarities = []
-            for sentence in context_sentences:
-                if self.embedding_model:
-                    response_embedding = self.embedding_model.encode([response])
-                    sentence_embedding = self.embedding_model.encode([sentence])
-                    
-                    similarity = cosine_similarity(response_embedding, sentence_embedding)[0][0]
-                    similarities.append(similarity)
-                else:
-                    similarity = self._calculate_token_similarity(response, sentence)
-                    similarities.append(similarity)
-            
-            # Adherence to maksymalne podobieństwo do kontekstu
-            return float(max(similarities)) if similarities else 0.0
+            # Adherence to maksymalne podobieństwo odpowiedzi do zdania z kontekstu
+            if self.embedding_model:
+                embeddings = self._get_embeddings([response] + context_sentences, embeddings)
+                sentence_matrix = self._stack_embeddings(context_sentences, embeddings)
+                return float((sentence_matrix @ embeddings[response]).max())
+            
+            return self._max_token_similarity(response, context_sentences)
             
         except Exception as e:
             logger.error(f"Błąd obliczania adherence: {e}")
             return 0.0
     
-    def _calculate_completeness(self, response: str, ground_truth: List[str]) -> float:
+    def _calculate_completeness(self, response: str, ground_truth: List[str],
+                                embeddings: Optional[Dict[str, np.ndarray]] = None) -> float:
         """
         Oblicza completeness - kompletność odpowiedzi względem ground truth
         
         Args:
             response: Wygenerowana odpowiedź
             ground_truth: Lista prawdziwych odpowiedzi
+            embeddings: Opcjonalne, wcześniej obliczone embeddingi tekstów
             
         Returns:
             Wartość completeness w przedziale [0, 1]
@@ -209,21 +408,13 @@ class TRACEService:
             return 0.0
         
         try:
-            # Sprawdź czy odpowiedź zawiera informacje z ground truth
-            similarities = []
-            for gt in ground_truth:
-                if self.embedding_model:
-                    response_embedding = self.embedding_model.encode([response])
-                    gt_embedding = self.embedding_model.encode([gt])
-                    
-                    similarity = cosine_similarity(response_embedding, gt_embedding)[0][0]
-                    similarities.append(similarity)
-                else:
-                    similarity = self._calculate_token_similarity(response, gt)
-                    similarities.append(similarity)
-            
             # Completeness to maksymalne podobieństwo do ground truth
-            return float(max(similarities)) if similarities else 0.0
+            if self.embedding_model:
+                embeddings = self._get_embeddings([response] + list(ground_truth), embeddings)
+                ground_truth_matrix = self._stack_embeddings(list(ground_truth), embeddings)
+                return float((ground_truth_matrix @ embeddings[response]).max())
+            
+            return self._max_token_similarity(response, ground_truth)
             
         except Exception as e:
             logger.error(f"Błąd obliczania completeness: {e}")
@@ -244,17 +435,49 @@ class TRACEService:
             return 0.0
         
         # Tokenizacja
-        tokens1 = set(text1.lower().split())
-        tokens2 = set(text2.lower().split())
+        tokens1 = _token_set(text1)
+        tokens2 = _token_set(text2)
         
         if not tokens1 or not tokens2:
             return 0.0
         
-        # Jaccard similarity
-        intersection = len(tokens1.intersection(tokens2))
-        union = len(tokens1.union(tokens2))
+        # Jaccard similarity - suma zbiorów wyliczana z liczności, bez budowania nowego zbioru
+        intersection = len(tokens1 & tokens2)
+        union = len(tokens1) + len(tokens2) - intersection
+        
+        return intersection / union
+    
+    def _max_token_similarity(self, text: str, candidates: List[str]) -> float:
+        """
+        Maksymalne podobieństwo tokenów tekstu do listy kandydatów (fallback)
+        
+        Args:
+            text: Tekst porównywany
+            candidates: Teksty kandydujące
+            
+        Returns:
+            Maksymalne podobieństwo Jaccarda w przedziale [0, 1]
+        """
+        tokens = _token_set(text) if text else frozenset()
+        if not tokens:
+            return 0.0
+        
+        best = 0.0
+        for candidate in candidates:
+            other = _token_set(candidate) if candidate else frozenset()
+            if not other:
+                continue
+            
+            # Jaccard nie przekracza min/max liczności zbiorów - pomijamy kandydatów bez szans na poprawę
+            if min(len(tokens), len(other)) <= best * max(len(tokens), len(other)):
+                continue
+            
+            intersection = len(tokens & other)
+            best = max(best, intersection / (len(tokens) + len(other) - intersection))
+            if best == 1.0:
+                break
         
-        return intersection / union if union > 0 else 0.0
+        return best
     
     def _split_into_sentences(self, text: str) -> List[str]:
         """
@@ -269,11 +492,7 @@ class TRACEService:
         if not text:
             return []
         
-        # Prosty podział na zdania
-        sentences = re.split(r'[.!?]+', text)
-        sentences = [s.strip() for s in sentences if s.strip()]
-        
-        return sentences
+        return list(_split_sentences_cached(text))
     
     def calculate_hallucination_rate(self, responses: List[str], contexts: List[Dict[str, Any]]) -> float:
         """
@@ -289,10 +508,18 @@ class TRACEService:
         if not responses or not contexts or len(responses) != len(contexts):
             return 0.0
         
+        # Odpowiedzi i zdania kontekstów wszystkich próbek kodujemy jednym wywołaniem modelu
+        embeddings = None
+        if self.embedding_model:
+            texts = []
+            for response, context in zip(responses, contexts):
+                texts.extend(self._collect_metric_texts(None, response, context, None))
+            embeddings = self._embed_texts(texts)
+        
         hallucination_count = 0
         
         for response, context in zip(responses, contexts):
-            adherence = self._calculate_adherence(response, context)
+            adherence = self._calculate_adherence(response, context, embeddings)
             
             # Jeśli adherence < 0.5, uznaj za halucynację
             if adherence < 0.5:
@@ -313,14 +540,19 @@ class TRACEService:
         if not results:
             return {}
         
-        metrics = ["relevance", "utilization", "adherence", "completeness"]
-        averages = {}
+        # Macierz (wyniki x metryki); brakująca metryka to NaN i nie wchodzi do średniej
+        values = np.fromiter(
+            (r.get(metric, np.nan) for r in results for metric in TRACE_METRICS),
+            dtype=np.float64,
+            count=len(results) * len(TRACE_METRICS)
+        ).reshape(-1, len(TRACE_METRICS))
         
-        for metric in metrics:
-            values = [r.get(metric, 0) for r in results if metric in r]
-            averages[metric] = sum(values) / len(values) if values else 0.0
+        present = ~np.isnan(values)
+        counts = present.sum(axis=0)
+        sums = np.where(present, values, 0.0).sum(axis=0)
+        averages = np.divide(sums, counts, out=np.zeros_like(sums), where=counts > 0)
         
-        return averages
+        return dict(zip(TRACE_METRICS, averages.tolist()))
 
 
 # Global instance
@@ -0,0 +1,53 @@
+"""
+Wspólne fixtures dla testów KnowledgeBase
+"""
+
+import hashlib
+
+import pytest
+
+# Testy korpusów sprawdzają jedynie istnienie i strukturę elementów, nie ich liczbę
+RAGBENCH_TEST_SAMPLE = 5
+
+
+@pytest.fixture
+def ragbench_corpus_sample(monkeypatch):
+    """Ogranicza korpusy RAGBench używane w testach do kilku dokumentów i zapytań"""
+    from app.services.ragbench_service import RAGBenchService
+
+    original_fetch = RAGBenchService._fetch_ragbench_corpus
+
+    def fetch_sample(self, domain):
+        corpus = original_fetch(self, domain)
+        return {
+            **corpus,
+            "documents": corpus["documents"][:RAGBENCH_TEST_SAMPLE],
+            "queries": corpus["queries"][:RAGBENCH_TEST_SAMPLE]
+        }
+
+    # Podmiana tylko na czas testu - pozostałe testy widzą pełne korpusy
+    monkeypatch.setattr(RAGBenchService, "_fetch_ragbench_corpus", fetch_sample)
+
+
+@pytest.fixture(scope="session")
+def trace_service():
+    """Jedna instancja TRACEService (wraz z modelem embeddingów) na sesję testową"""
+    from app.services.trace_service import TRACEService
+
+    return TRACEService()
+
+
+@pytest.fixture(scope="session")
+def cached_trace_metrics(trace_service):
+    """calculate_metrics z pamięcią wyników dla identycznych wejść"""
+    cache = {}
+
+    def calculate(query, response, context, ground_truth):
+        key = hashlib.blake2b(
+            repr((query, response, context, ground_truth)).encode(), digest_size=16
+        ).digest()
+        if key not in cache:
+            cache[key] = trace_service.calculate_metrics(query, response, context, ground_truth)
+        return dict(cache[key])
+
+    return calculate
@@ -3,10 +3,13 @@ Testy importu RAGBench do systemu KnowledgeBase
 """
 
 import pytest
-from unittest.mock import Mock, patch
+from types import SimpleNamespace
+from unittest.mock import Mock
 from app.services.ragbench_service import RAGBenchService, RAGBenchQuery
 from app.services.trace_service import TRACEService
 
+pytestmark = pytest.mark.usefixtures("ragbench_corpus_sample")
+
 
 class TestRAGBenchImport:
     """Testy importu korpusów RAGBench"""
@@ -53,24 +56,17 @@ class TestRAGBenchImport:
         """Test struktury danych korpusu"""
         corpus_data = self.ragbench_service._fetch_ragbench_corpus("FinQA")
         
-        assert "documents" in corpus_data
-        assert "queries" in corpus_data
+        assert {"documents", "queries"} <= corpus_data.keys()
         assert len(corpus_data["documents"]) > 0
         assert len(corpus_data["queries"]) > 0
         
         # Sprawdź strukturę dokumentu
         doc = corpus_data["documents"][0]
-        assert "id" in doc
-        assert "title" in doc
-        assert "content" in doc
-        assert "domain" in doc
+        assert {"id", "title", "content", "domain"} <= doc.keys()
         
         # Sprawdź strukturę zapytania
         query = corpus_data["queries"][0]
-        assert "query_id" in query
-        assert "query" in query
-        assert "ground_truth" in query
-        assert "expected_answer" in query
+        assert {"query_id", "query", "ground_truth", "expected_answer"} <= query.keys()
 
 
 class TestRAGBenchQueries:
@@ -87,11 +83,12 @@ class TestRAGBenchQueries:
         
         assert len(queries) > 0
         
-        for query in queries:
-            assert query["domain"] == "FinQA"
-            assert query["query"] is not None
-            assert query["ground_truth"] is not None
-            assert query["expected_answer"] is not None
+        invalid = next((
+            q for q in queries
+            if not (q["domain"] == "FinQA" and q["query"] is not None
+                    and q["ground_truth"] is not None and q["expected_answer"] is not None)
+        ), None)
+        assert invalid is None, invalid
     
     def test_tatqa_queries(self):
         """Test zapytań TAT-QA"""
@@ -100,11 +97,12 @@ class TestRAGBenchQueries:
         
         assert len(queries) > 0
         
-        for query in queries:
-            assert query["domain"] == "TAT-QA"
-            assert query["query"] is not None
-            assert query["ground_truth"] is not None
-            assert query["expected_answer"] is not None
+        invalid = next((
+            q for q in queries
+            if not (q["domain"] == "TAT-QA" and q["query"] is not None
+                    and q["ground_truth"] is not None and q["expected_answer"] is not None)
+        ), None)
+        assert invalid is None, invalid
     
     def test_techqa_queries(self):
         """Test zapytań TechQA"""
@@ -113,11 +111,12 @@ class TestRAGBenchQueries:
         
         assert len(queries) > 0
         
-        for query in queries:
-            assert query["domain"] == "TechQA"
-            assert query["query"] is not None
-            assert query["ground_truth"] is not None
-            assert query["expected_answer"] is not None
+        invalid = next((
+            q for q in queries
+            if not (q["domain"] == "TechQA" and q["query"] is not None
+                    and q["ground_truth"] is not None and q["expected_answer"] is not None)
+        ), None)
+        assert invalid is None, invalid
 
 
 class TestRAGBenchDocuments:
@@ -134,11 +133,12 @@ class TestRAGBenchDocuments:
         
         assert len(documents) > 0
         
-        for doc in documents:
-            assert doc["domain"] == "FinQA"
-            assert doc["title"] is not None
-            assert doc["content"] is not None
-            assert len(doc["content"]) > 0
+        invalid = next((
+            d for d in documents
+            if not (d["domain"] == "FinQA" and d["title"] is not None
+                    and d["content"] is not None and len(d["content"]) > 0)
+        ), None)
+        assert invalid is None, invalid
     
     def test_tatqa_documents(self):
         """Test dokumentów TAT-QA"""
@@ -147,11 +147,12 @@ class TestRAGBenchDocuments:
         
         assert len(documents) > 0
         
-        for doc in documents:
-            assert doc["domain"] == "TAT-QA"
-            assert doc["title"] is not None
-            assert doc["content"] is not None
-            assert len(doc["content"]) > 0
+        invalid = next((
+            d for d in documents
+            if not (d["domain"] == "TAT-QA" and d["title"] is not None
+                    and d["content"] is not None and len(d["content"]) > 0)
+        ), None)
+        assert invalid is None, invalid
     
     def test_techqa_documents(self):
         """Test dokumentów TechQA"""
@@ -160,11 +161,12 @@ class TestRAGBenchDocuments:
         
         assert len(documents) > 0
         
-        for doc in documents:
-            assert doc["domain"] == "TechQA"
-            assert doc["title"] is not None
-            assert doc["content"] is not None
-            assert len(doc["content"]) > 0
+        invalid = next((
+            d for d in documents
+            if not (d["domain"] == "TechQA" and d["title"] is not None
+                    and d["content"] is not None and len(d["content"]) > 0)
+        ), None)
+        assert invalid is None, invalid
 
 
 class TestRAGBenchIntegration:
@@ -174,38 +176,35 @@ class TestRAGBenchIntegration:
         """Przygotowanie testów"""
         self.ragbench_service = RAGBenchService()
     
-    @patch('app.services.ragbench_service.get_db')
-    def test_document_import_integration(self, mock_get_db):
+    @pytest.mark.slow
+    def test_document_import_integration(self, monkeypatch):
         """Test integracji importu dokumentów"""
         # Mock bazy danych
         mock_db = Mock()
-        mock_get_db.return_value = mock_db
+        monkeypatch.setattr('app.services.ragbench_service.get_db', Mock(return_value=mock_db))
         
         # Mock ArticleService
-        with patch('app.services.ragbench_service.ArticleService') as mock_article_service:
-            mock_service = Mock()
-            mock_article_service.return_value = mock_service
-            
-            # Mock tworzenia artykułu
-            mock_article = Mock()
-            mock_article.id = 1
-            mock_article.title = "Test Article"
-            mock_service.create_article.return_value = mock_article
-            
-            # Mock przetwarzania artykułu
-            mock_service.process_article.return_value = {
-                "status": "indexed",
-                "fragments_created": 5,
-                "facts_created": 3
-            }
-            
-            # Test importu
-            result = self.ragbench_service.import_corpus("FinQA")
-            
-            assert result["status"] == "success"
-            assert result["documents_imported"] > 0
-            assert result["fragments_created"] > 0
-            assert result["facts_created"] > 0
+        mock_service = Mock()
+        monkeypatch.setattr('app.services.ragbench_service.ArticleService', Mock(return_value=mock_service))
+        
+        # Mock tworzenia artykułu
+        mock_article = SimpleNamespace(id=1, title="Test Article")
+        mock_service.create_article.return_value = mock_article
+        
+        # Mock przetwarzania artykułu
+        mock_service.process_article.return_value = {
+            "status": "indexed",
+            "fragments_created": 5,
+            "facts_created": 3
+        }
+        
+        # Test importu
+        result = self.ragbench_service.import_corpus("FinQA")
+        
+        assert result["status"] == "success"
+        assert result["documents_imported"] > 0
+        assert result["fragments_created"] > 0
+        assert result["facts_created"] > 0
     
     def test_query_import_structure(self):
         """Test struktury importu zapytań"""
@@ -217,13 +216,13 @@ class TestRAGBenchIntegration:
         
         assert len(imported_queries) == len(queries)
         
-        for query in imported_queries:
-            assert isinstance(query, RAGBenchQuery)
-            assert query.query_id is not None
-            assert query.query is not None
-            assert query.domain is not None
-            assert query.ground_truth is not None
-            assert query.expected_answer is not None
+        invalid = next((
+            q for q in imported_queries
+            if not (isinstance(q, RAGBenchQuery) and q.query_id is not None
+                    and q.query is not None and q.domain is not None
+                    and q.ground_truth is not None and q.expected_answer is not None)
+        ), None)
+        assert invalid is None, invalid
 
 
 class TestRAGBenchErrorHandling:
@@ -239,29 +238,28 @@ class TestRAGBenchErrorHandling:
         with pytest.raises(ValueError):
             self.ragbench_service.import_corpus("InvalidDomain")
     
-    def test_corpus_data_validation(self):
+    def test_corpus_data_validation(self, monkeypatch):
         """Test walidacji danych korpusu"""
         # Test z pustymi danymi
         empty_corpus = {"documents": [], "queries": []}
         
         # Mock _fetch_ragbench_corpus
-        with patch.object(self.ragbench_service, '_fetch_ragbench_corpus', return_value=empty_corpus):
-            result = self.ragbench_service.import_corpus("FinQA")
-            
-            assert result["status"] == "success"
-            assert result["documents_imported"] == 0
-            assert result["queries_imported"] == 0
+        monkeypatch.setattr(self.ragbench_service, '_fetch_ragbench_corpus', Mock(return_value=empty_corpus))
+        result = self.ragbench_service.import_corpus("FinQA")
+        
+        assert result["status"] == "success"
+        assert result["documents_imported"] == 0
+        assert result["queries_imported"] == 0
     
-    def test_import_partial_failure(self):
+    def test_import_partial_failure(self, monkeypatch):
         """Test częściowego niepowodzenia importu"""
         # Mock częściowego niepowodzenia
-        with patch.object(self.ragbench_service, '_import_documents') as mock_import:
-            mock_import.side_effect = Exception("Import error")
-            
-            result = self.ragbench_service.import_corpus("FinQA")
-            
-            assert result["status"] == "error"
-            assert "error" in result
+        monkeypatch.setattr(self.ragbench_service, '_import_documents', Mock(side_effect=Exception("Import error")))
+        
+        result = self.ragbench_service.import_corpus("FinQA")
+        
+        assert result["status"] == "error"
+        assert "error" in result
 
 
 if __name__ == "__main__":
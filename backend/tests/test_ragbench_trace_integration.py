@@ -1,21 +1,41 @@
 """
 Testy integracyjne RAGBench + TRACe metryki
+
+PYTEST_DONT_REWRITE - asercje porównują proste wartości skalarne,
+przepisywanie asercji przez pytest nie daje tu czytelniejszych komunikatów
 """
 
+import numpy as np
 import pytest
-from unittest.mock import Mock, patch
+from dataclasses import replace
+from types import SimpleNamespace
+from unittest.mock import Mock
 from app.services.ragbench_service import RAGBenchService, RAGBenchQuery, RAGBenchResult
-from app.services.trace_service import TRACEService
 
+# Szablon zapytania - testy nadpisują tylko pola, które się różnią
+_Q_TEMPLATE = RAGBenchQuery(
+    query_id="",
+    query="",
+    domain="FinQA",
+    ground_truth=[],
+    context=[],
+    expected_answer="",
+    metadata={}
+)
 
-class TestRAGBenchTRACEIntegration:
-    """Testy integracji RAGBench z metrykami TRACe"""
-    
-    def setup_method(self):
-        """Przygotowanie testów"""
-        self.ragbench_service = RAGBenchService()
-        self.trace_service = TRACEService()
+
+@pytest.fixture
+def mock_search_service(monkeypatch):
+    """Podmienia SearchService w RAGBenchService i zwraca jego instancję-mock"""
+    mock_service = Mock()
+    monkeypatch.setattr('app.services.ragbench_service.SearchService', Mock(return_value=mock_service))
+    return mock_service
+
+
+class TestRAGBenchStructures:
+    """Testy struktur danych RAGBench - bez ładowania modeli"""
     
+    @pytest.mark.fast
     def test_ragbench_query_structure(self):
         """Test struktury zapytań RAGBench"""
         query = RAGBenchQuery(
@@ -35,6 +55,7 @@ class TestRAGBenchTRACEIntegration:
         assert query.expected_answer == "Warsaw"
         assert query.metadata["difficulty"] == "easy"
     
+    @pytest.mark.fast
     def test_ragbench_result_structure(self):
         """Test struktury wyników RAGBench"""
         result = RAGBenchResult(
@@ -58,12 +79,37 @@ class TestRAGBenchTRACEIntegration:
         assert result.strategy == "text"
         assert result.response == "Warsaw is the capital of Poland"
         assert len(result.context_used) == 1
-        assert result.metrics["relevance"] == 0.9
+        assert result.metrics.dtype == np.float32
+        assert result.metrics_dict["relevance"] == pytest.approx(0.9)
         assert result.latency == 1500.0
         assert result.tokens == 150
         assert result.cost == 0.003
     
-    def test_trace_metrics_integration(self):
+    @pytest.mark.fast
+    def test_ragbench_result_equality(self):
+        """Porównanie wyników uwzględnia wektor metryk (numpy)"""
+        fields = dict(
+            query_id="test_1", strategy="text", response="Warsaw", context_used=[],
+            latency=1500.0, tokens=150, cost=0.003, timestamp="2024-01-15T10:30:00Z"
+        )
+        result = RAGBenchResult(metrics={"relevance": 0.9}, **fields)
+        
+        assert result == RAGBenchResult(metrics={"relevance": 0.9}, **fields)
+        assert result != RAGBenchResult(metrics={"relevance": 0.5}, **fields)
+
+
+class TestRAGBenchTRACEIntegration:
+    """Testy integracji RAGBench z metrykami TRACe"""
+    
+    @pytest.fixture(autouse=True)
+    def _services(self, trace_service, monkeypatch):
+        """RAGBenchService korzystający ze współdzielonej (sesyjnej) instancji TRACEService"""
+        monkeypatch.setattr('app.services.ragbench_service.TRACEService', Mock(return_value=trace_service))
+        self.ragbench_service = RAGBenchService()
+        self.trace_service = trace_service
+    
+    @pytest.mark.slow
+    def test_trace_metrics_integration(self, cached_trace_metrics):
         """Test integracji metryk TRACe z RAGBench"""
         query = "What is the capital of Poland?"
         response = "Warsaw is the capital of Poland"
@@ -76,7 +122,7 @@ class TestRAGBenchTRACEIntegration:
         ground_truth = ["Warsaw is the capital of Poland"]
         
         # Oblicz metryki TRACe
-        metrics = self.trace_service.calculate_metrics(query, response, context, ground_truth)
+        metrics = cached_trace_metrics(query, response, context, ground_truth)
         
         # Sprawdź czy wszystkie metryki są obecne
         assert "relevance" in metrics
@@ -85,64 +131,46 @@ class TestRAGBenchTRACEIntegration:
         assert "completeness" in metrics
         
         # Sprawdź czy wartości są w odpowiednim zakresie
-        for metric, value in metrics.items():
-            assert 0.0 <= value <= 1.0
+        values = np.fromiter(metrics.values(), dtype=np.float64)
+        assert values.size and np.all((values >= 0.0) & (values <= 1.0)), metrics
     
-    def test_ragbench_evaluation_workflow(self):
+    @pytest.mark.slow
+    def test_ragbench_evaluation_workflow(self, mock_search_service):
         """Test workflow ewaluacji RAGBench"""
         # Przygotuj zapytania testowe
         queries = [
-            RAGBenchQuery(
-                query_id="test_1",
-                query="What is the capital of Poland?",
-                domain="FinQA",
-                ground_truth=["Warsaw is the capital of Poland"],
-                context=[],
-                expected_answer="Warsaw",
-                metadata={}
-            ),
-            RAGBenchQuery(
-                query_id="test_2",
-                query="What is the population of Warsaw?",
-                domain="FinQA",
-                ground_truth=["Warsaw has about 1.8 million inhabitants"],
-                context=[],
-                expected_answer="1.8 million",
-                metadata={}
-            )
+            replace(_Q_TEMPLATE, query_id="test_1", query="What is the capital of Poland?",
+                    ground_truth=["Warsaw is the capital of Poland"], expected_answer="Warsaw"),
+            replace(_Q_TEMPLATE, query_id="test_2", query="What is the population of Warsaw?",
+                    ground_truth=["Warsaw has about 1.8 million inhabitants"], expected_answer="1.8 million")
         ]
         
-        # Mock SearchService
-        with patch('app.services.ragbench_service.SearchService') as mock_search_service:
-            mock_service = Mock()
-            mock_search_service.return_value = mock_service
-            
-            # Mock wyników wyszukiwania
-            mock_service.search.side_effect = [
-                {
-                    "response": "Warsaw is the capital of Poland",
-                    "context": {
-                        "fragments": [{"content": "Warsaw is the capital of Poland since 1596"}]
-                    },
-                    "tokens_used": 150
+        # Mock wyników wyszukiwania
+        mock_search_service.search.side_effect = [
+            {
+                "response": "Warsaw is the capital of Poland",
+                "context": {
+                    "fragments": [{"content": "Warsaw is the capital of Poland since 1596"}]
                 },
-                {
-                    "response": "Warsaw has about 1.8 million inhabitants",
-                    "context": {
-                        "fragments": [{"content": "Warsaw has about 1.8 million inhabitants"}]
-                    },
-                    "tokens_used": 200
-                }
-            ]
-            
-            # Wykonaj ewaluację
-            results = self.ragbench_service.evaluate_strategy("FinQA", "text", queries)
-            
-            assert len(results) == 2
-            assert results[0].query_id == "test_1"
-            assert results[1].query_id == "test_2"
-            assert results[0].strategy == "text"
-            assert results[1].strategy == "text"
+                "tokens_used": 150
+            },
+            {
+                "response": "Warsaw has about 1.8 million inhabitants",
+                "context": {
+                    "fragments": [{"content": "Warsaw has about 1.8 million inhabitants"}]
+                },
+                "tokens_used": 200
+            }
+        ]
+        
+        # Wykonaj ewaluację
+        results = self.ragbench_service.evaluate_strategy("FinQA", "text", queries)
+        
+        assert len(results) == 2
+        assert results[0].query_id == "test_1"
+        assert results[1].query_id == "test_2"
+        assert results[0].strategy == "text"
+        assert results[1].strategy == "text"
     
     def test_ragbench_comparison_report(self):
         """Test generowania raportu porównawczego"""
@@ -197,22 +225,17 @@ class TestRAGBenchTRACEIntegration:
         # Sprawdź strukturę raportu
         assert "domains" in report
         assert "FinQA" in report["domains"]
-        assert "text" in report["domains"]["FinQA"]
-        assert "facts" in report["domains"]["FinQA"]
-        assert "graph" in report["domains"]["FinQA"]
+        assert {"text", "facts", "graph"} <= report["domains"]["FinQA"].keys()
         
         # Sprawdź metryki dla każdej strategii
         finqa_stats = report["domains"]["FinQA"]
         
+        expected_keys = {
+            "adherence", "completeness", "utilization", "relevance",
+            "p95_latency", "avg_tokens", "avg_cost", "total_queries"
+        }
         for strategy in ["text", "facts", "graph"]:
-            assert "adherence" in finqa_stats[strategy]
-            assert "completeness" in finqa_stats[strategy]
-            assert "utilization" in finqa_stats[strategy]
-            assert "relevance" in finqa_stats[strategy]
-            assert "p95_latency" in finqa_stats[strategy]
-            assert "avg_tokens" in finqa_stats[strategy]
-            assert "avg_cost" in finqa_stats[strategy]
-            assert "total_queries" in finqa_stats[strategy]
+            assert expected_keys <= finqa_stats[strategy].keys()
     
     def test_ragbench_metrics_calculation(self):
         """Test obliczania metryk RAGBench"""
@@ -245,65 +268,36 @@ class TestRAGBenchTRACEIntegration:
         # Oblicz średnie metryki
         avg_metrics = self.ragbench_service._calculate_average_metrics(results)
         
-        assert "adherence" in avg_metrics
-        assert "completeness" in avg_metrics
-        assert "utilization" in avg_metrics
-        assert "relevance" in avg_metrics
-        assert "tokens" in avg_metrics
-        assert "cost" in avg_metrics
+        assert {"adherence", "completeness", "utilization", "relevance", "tokens", "cost"} <= avg_metrics.keys()
         
         # Sprawdź czy średnie są logiczne
-        assert 0.0 <= avg_metrics["adherence"] <= 1.0
-        assert 0.0 <= avg_metrics["completeness"] <= 1.0
-        assert 0.0 <= avg_metrics["utilization"] <= 1.0
-        assert 0.0 <= avg_metrics["relevance"] <= 1.0
+        trace_values = np.array(
+            [avg_metrics[name] for name in ("adherence", "completeness", "utilization", "relevance")]
+        )
+        assert np.all((trace_values >= 0.0) & (trace_values <= 1.0)), avg_metrics
         assert avg_metrics["tokens"] > 0
         assert avg_metrics["cost"] > 0
+        
+        # Sprawdź wartości średnich dla wszystkich metryk TRACe naraz
+        assert np.allclose(
+            [avg_metrics[name] for name in ("adherence", "completeness", "utilization", "relevance")],
+            [0.825, 0.875, 0.775, 0.875]
+        )
     
-    def test_ragbench_p95_latency_calculation(self):
+    @pytest.mark.parametrize("latencies, min_p95", [
+        ((1000.0, 2000.0, 3000.0), 2000.0),  # P95 powinien być >= 2000ms
+        ((1500.0,), 1500.0),
+    ])
+    def test_ragbench_p95_latency_calculation(self, latencies, min_p95):
         """Test obliczania 95 percentyla latencji"""
-        # Przygotuj wyniki z różnymi latencjami
-        results = [
-            RAGBenchResult(
-                query_id="test_1",
-                strategy="text",
-                response="Response 1",
-                context_used=[],
-                metrics={},
-                latency=1000.0,
-                tokens=100,
-                cost=0.002,
-                timestamp="2024-01-15T10:30:00Z"
-            ),
-            RAGBenchResult(
-                query_id="test_2",
-                strategy="text",
-                response="Response 2",
-                context_used=[],
-                metrics={},
-                latency=2000.0,
-                tokens=200,
-                cost=0.004,
-                timestamp="2024-01-15T10:30:00Z"
-            ),
-            RAGBenchResult(
-                query_id="test_3",
-                strategy="text",
-                response="Response 3",
-                context_used=[],
-                metrics={},
-                latency=3000.0,
-                tokens=300,
-                cost=0.006,
-                timestamp="2024-01-15T10:30:00Z"
-            )
-        ]
+        # _calculate_p95_latency czyta wyłącznie atrybut latency
+        results = [SimpleNamespace(latency=latency) for latency in latencies]
         
         # Oblicz P95 latencji
         p95_latency = self.ragbench_service._calculate_p95_latency(results)
         
         assert p95_latency > 0
-        assert p95_latency >= 2000.0  # P95 powinien być >= 2000ms
+        assert p95_latency >= min_p95
     
     def test_ragbench_recommendations_generation(self):
         """Test generowania rekomendacji"""
@@ -350,31 +344,21 @@ class TestRAGBenchTRACEIntegration:
         assert graph_cost < text_cost  # Graph powinien być tańszy
         assert graph_cost < facts_cost  # Graph powinien być najtańszy
     
-    def test_ragbench_error_handling(self):
+    def test_ragbench_error_handling(self, mock_search_service):
         """Test obsługi błędów w RAGBench"""
         # Test z nieprawidłowymi danymi
-        with patch('app.services.ragbench_service.SearchService') as mock_search_service:
-            mock_service = Mock()
-            mock_search_service.return_value = mock_service
-            mock_service.search.side_effect = Exception("Search error")
-            
-            queries = [
-                RAGBenchQuery(
-                    query_id="test_1",
-                    query="Test query",
-                    domain="FinQA",
-                    ground_truth=["Test answer"],
-                    context=[],
-                    expected_answer="Test answer",
-                    metadata={}
-                )
-            ]
-            
-            # Wykonaj ewaluację (powinna obsłużyć błąd)
-            results = self.ragbench_service.evaluate_strategy("FinQA", "text", queries)
-            
-            # Sprawdź czy błąd został obsłużony
-            assert len(results) == 0  # Brak wyników z powodu błędu
+        mock_search_service.search.side_effect = Exception("Search error")
+        
+        queries = [
+            replace(_Q_TEMPLATE, query_id="test_1", query="Test query",
+                    ground_truth=["Test answer"], expected_answer="Test answer")
+        ]
+        
+        # Wykonaj ewaluację (powinna obsłużyć błąd)
+        results = self.ragbench_service.evaluate_strategy("FinQA", "text", queries)
+        
+        # Sprawdź czy błąd został obsłużony
+        assert len(results) == 0  # Brak wyników z powodu błędu
 
 
 if __name__ == "__main__":
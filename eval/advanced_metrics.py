@@ -7,19 +7,65 @@ Zaawansowane metryki ewaluacji RAG
 - Response Quality Scoring
 """
 
+import hashlib
 import logging
+import os
 import re
 import numpy as np
-from typing import Dict, List, Any, Optional, Tuple
-from dataclasses import dataclass
+from typing import Dict, List, Any, Optional
+from dataclasses import dataclass, astuple
+from enum import IntEnum
 from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
 import spacy
-from collections import Counter
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from statistics import fmean
 import json
 
+try:
+    import diskcache
+except ImportError:
+    diskcache = None
+
 logger = logging.getLogger(__name__)
 
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+
+# Backend modelu embeddingów: "torch" lub "onnx-int8" (ONNX Runtime, wymaga optimum[onnxruntime])
+EMBEDDING_BACKEND = os.getenv("ADVANCED_METRICS_EMBEDDING_BACKEND", "torch")
+ONNX_INT8_FILE_NAME = "onnx/model_qint8_avx512_vnni.onnx"
+
+# Górne oszacowanie liczby znaków na token - dłuższe teksty są przycinane przed
+# tokenizacją (model i tak obcina wejście do max_seq_length tokenów)
+MAX_CHARS_PER_TOKEN = 16
+
+# Maksymalna liczba embeddingów w pamięci podręcznej LRU ewaluatora
+EMBEDDING_CACHE_SIZE = 4096
+
+# Metryki używają spaCy wyłącznie do podziału na zdania (doc.sents) - komponenty
+# statystyczne nie są ładowane, zdania wyznacza regułowy sentencizer
+SPACY_EXCLUDED_COMPONENTS = [
+    "tok2vec", "tagger", "morphologizer", "parser", "lemmatizer", "attribute_ruler", "ner", "senter"
+]
+
+# Rozmiar partii nlp.pipe przy podziale wielu odpowiedzi na zdania
+SPACY_BATCH_SIZE = int(os.getenv("ADVANCED_METRICS_SPACY_BATCH_SIZE", "64"))
+
+# Liczba wątków liczących metryki przykładów partii po wspólnym kodowaniu; 1 - sekwencyjnie
+METRIC_WORKERS = int(os.getenv("ADVANCED_METRICS_WORKERS", "1"))
+
+# Katalog trwałej pamięci podręcznej embeddingów (diskcache); pusty - wyłączona
+EMBEDDING_CACHE_DIR = os.getenv("ADVANCED_METRICS_CACHE_DIR", "")
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+@lru_cache(maxsize=1024)
+def _token_set(text: str) -> frozenset:
+    """Zbiór tokenów tekstu; zapamiętywany, bo ta sama odpowiedź jest porównywana z wieloma tekstami"""
+    return frozenset(_TOKEN_RE.findall(text.lower()))
+
 
 @dataclass
 class AdvancedMetrics:
@@ -32,6 +78,57 @@ class AdvancedMetrics:
     fluency_score: float
     specificity_score: float
     completeness_score: float
+    
+    @classmethod
+    def zero(cls) -> "AdvancedMetrics":
+        """Metryki zerowe - dla pustych odpowiedzi i błędów obliczeń"""
+        return cls(0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0)
+
+
+class MetricColumn(IntEnum):
+    """Indeksy kolumn macierzy AdvancedMetricsBatch (kolejność pól AdvancedMetrics)"""
+    HALLUCINATION_SCORE = 0
+    FACTUAL_ACCURACY = 1
+    CONTEXT_UTILIZATION = 2
+    RESPONSE_QUALITY = 3
+    COHERENCE_SCORE = 4
+    FLUENCY_SCORE = 5
+    SPECIFICITY_SCORE = 6
+    COMPLETENESS_SCORE = 7
+
+
+# Rekomendacje raportu jakości: (metryka, próg, treść) - dodawane gdy metryka < próg
+QUALITY_RECOMMENDATIONS = [
+    (MetricColumn.HALLUCINATION_SCORE, 0.7, "Zwiększ weryfikację faktów w odpowiedzi"),
+    (MetricColumn.CONTEXT_UTILIZATION, 0.6, "Lepiej wykorzystuj dostępny kontekst"),
+    (MetricColumn.COHERENCE_SCORE, 0.7, "Popraw spójność odpowiedzi"),
+    (MetricColumn.FLUENCY_SCORE, 0.6, "Popraw płynność językową"),
+]
+
+
+@dataclass
+class AdvancedMetricsBatch:
+    """Zaawansowane metryki wielu przykładów w układzie kolumnowym - macierz (M, 8) float32"""
+    scores: np.ndarray
+    
+    @classmethod
+    def from_metrics(cls, metrics: List[AdvancedMetrics]) -> "AdvancedMetricsBatch":
+        """Buduje partię z listy metryk pojedynczych przykładów"""
+        scores = np.array([astuple(m) for m in metrics], dtype=np.float32)
+        return cls(scores.reshape(len(metrics), len(MetricColumn)))
+    
+    def __len__(self) -> int:
+        return self.scores.shape[0]
+    
+    def __getitem__(self, index: int) -> AdvancedMetrics:
+        return AdvancedMetrics(*self.scores[index].tolist())
+    
+    def __iter__(self):
+        return (self[index] for index in range(len(self)))
+    
+    def column(self, column: MetricColumn) -> np.ndarray:
+        """Wartości jednej metryki dla wszystkich przykładów"""
+        return self.scores[:, column]
 
 
 class AdvancedEvaluator:
@@ -39,8 +136,13 @@ class AdvancedEvaluator:
     
     def __init__(self):
         self.embedding_model = None
-        self.nlp = None
+        self._embedding_model_id = EMBEDDING_MODEL_NAME
+        self._nlp = None
+        self._nlp_initialized = False
+        self._embedding_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._disk_cache = None
         self._initialize_models()
+        self._initialize_disk_cache()
         
         # Słowniki do wykrywania halucynacji
         self.hallucination_indicators = [
@@ -48,34 +150,91 @@ class AdvancedEvaluator:
             "wydaje mi się", "być może", "nie mam pewności"
         ]
         
-        # Wzorce halucynacji
-        self.hallucination_patterns = [
-            r"\d{4}-\d{2}-\d{2}",  # Daty
-            r"\$\d+",  # Kwoty
-            r"\d+%",  # Procenty
-            r"\d+\.\d+",  # Liczby dziesiętne
+        # Wszystkie wskaźniki wyszukiwane jednym przejściem po tekście; lookahead pozwala
+        # znaleźć wskaźniki nakładające się (np. "może" wewnątrz "być może")
+        self._indicator_pattern = re.compile(
+            "(?=(" + "|".join(re.escape(indicator.lower()) for indicator in self.hallucination_indicators) + "))"
+        )
+        
+        # Wzorce halucynacji: daty, kwoty, procenty, liczby dziesiętne - jedna alternatywa
+        # w lookahead; nazwana grupa wskazuje, który wzorzec wystąpił
+        self.hallucination_pattern = re.compile(
+            r"(?=(?P<date>\d{4}-\d{2}-\d{2})|(?P<amount>\$\d+)|(?P<percent>\d+%)|(?P<decimal>\d+\.\d+))"
+        )
+        
+        # Wzorce płynności językowej (kompilowane raz)
+        self.fluency_patterns = [
+            re.compile(r'\b(ale|jednak|ponadto|dodatkowo|więc|zatem)\b', re.IGNORECASE),  # Spójniki
+            re.compile(r'\b(przede wszystkim|po pierwsze|po drugie)\b', re.IGNORECASE),  # Struktura
+            re.compile(r'\b(na przykład|na przykład|czyli)\b', re.IGNORECASE),  # Przykłady
         ]
     
     def _initialize_models(self):
         """Inicjalizuje modele NLP"""
-        try:
-            # Model embeddingów
-            self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-            logger.info("Model embeddingów zainicjalizowany")
-        except Exception as e:
-            logger.warning(f"Nie udało się załadować modelu embeddingów: {e}")
+        if EMBEDDING_BACKEND == "onnx-int8":
+            try:
+                # Skwantyzowany (int8) model ONNX - szybsze kodowanie na CPU
+                self.embedding_model = SentenceTransformer(
+                    EMBEDDING_MODEL_NAME, backend="onnx", model_kwargs={"file_name": ONNX_INT8_FILE_NAME}
+                )
+                self._embedding_model_id = f"{EMBEDDING_MODEL_NAME}/{ONNX_INT8_FILE_NAME}"
+                logger.info("Model embeddingów (ONNX int8) zainicjalizowany")
+            except Exception as e:
+                logger.warning(f"Nie udało się załadować modelu ONNX int8, używam PyTorch: {e}")
         
+        if self.embedding_model is None:
+            try:
+                # Model embeddingów
+                self.embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+                logger.info("Model embeddingów zainicjalizowany")
+            except Exception as e:
+                logger.warning(f"Nie udało się załadować modelu embeddingów: {e}")
+    
+    @property
+    def nlp(self):
+        """Model spaCy ładowany przy pierwszym użyciu (None gdy niedostępny)"""
+        if not self._nlp_initialized:
+            self._nlp_initialized = True
+            self._nlp = self._initialize_spacy()
+        return self._nlp
+    
+    def _initialize_spacy(self):
+        """Ładuje model spaCy - polski, w razie niepowodzenia angielski"""
         try:
             # Model spaCy
-            self.nlp = spacy.load("pl_core_news_sm")
+            nlp = self._load_spacy_model("pl_core_news_sm")
             logger.info("Model spaCy zainicjalizowany")
+            return nlp
         except Exception as e:
             logger.warning(f"Nie udało się załadować modelu spaCy: {e}")
             try:
-                self.nlp = spacy.load("en_core_web_sm")
+                nlp = self._load_spacy_model("en_core_web_sm")
                 logger.info("Model spaCy (en) zainicjalizowany")
+                return nlp
             except Exception as e2:
                 logger.warning(f"Nie udało się załadować modelu spaCy (en): {e2}")
+                return None
+    
+    @staticmethod
+    def _load_spacy_model(name: str):
+        """Ładuje model spaCy ograniczony do tokenizacji i regułowego podziału na zdania"""
+        nlp = spacy.load(name, exclude=SPACY_EXCLUDED_COMPONENTS)
+        nlp.add_pipe("sentencizer")
+        return nlp
+    
+    def _initialize_disk_cache(self):
+        """Otwiera trwałą pamięć podręczną embeddingów (opcjonalnie, wymaga diskcache)"""
+        if not EMBEDDING_CACHE_DIR:
+            return
+        if diskcache is None:
+            logger.warning("diskcache nie jest zainstalowane - embeddingi buforowane tylko w pamięci")
+            return
+        
+        try:
+            self._disk_cache = diskcache.Cache(EMBEDDING_CACHE_DIR)
+            logger.info(f"Trwała pamięć podręczna embeddingów: {EMBEDDING_CACHE_DIR}")
+        except Exception as e:
+            logger.warning(f"Nie udało się otworzyć pamięci podręcznej embeddingów: {e}")
     
     def calculate_advanced_metrics(
         self, 
@@ -96,30 +255,123 @@ class AdvancedEvaluator:
         Returns:
             Zaawansowane metryki
         """
+        # Pusta odpowiedź - metryki zerowe bez uruchamiania modeli
+        if self._is_trivial(response):
+            return AdvancedMetrics.zero()
+        
+        # Zdania odpowiedzi (spójność) wyznaczane raz
+        sentences = self._response_sentences(response)
+        
+        # Wszystkie teksty potrzebne metrykom kodujemy jednym wywołaniem modelu
+        embeddings = self._embed_metric_texts(
+            self._collect_metric_texts(query, response, context, ground_truth, sentences)
+        )
+        
+        return self._compute_metrics(query, response, context, ground_truth, sentences, embeddings)
+    
+    def calculate_advanced_metrics_batch(
+        self,
+        queries: List[str],
+        responses: List[str],
+        contexts: List[Dict[str, Any]],
+        ground_truths: List[List[str]]
+    ) -> AdvancedMetricsBatch:
+        """
+        Oblicza zaawansowane metryki dla wielu odpowiedzi
+        
+        Zdania wszystkich odpowiedzi wyznacza jeden strumień nlp.pipe, a teksty
+        wszystkich przykładów są kodowane jednym wywołaniem modelu embeddingów.
+        Wyniki trafiają wierszami do jednej macierzy (M, 8).
+        
+        Args:
+            queries: Zapytania użytkownika
+            responses: Wygenerowane odpowiedzi
+            contexts: Konteksty wykorzystane
+            ground_truths: Prawdziwe odpowiedzi dla każdego przykładu
+            
+        Returns:
+            Partia metryk; wiersze w kolejności przykładów
+        """
+        items = list(zip(queries, responses, contexts, ground_truths))
+        scores = np.zeros((len(items), len(MetricColumn)), dtype=np.float32)
+        
+        # Puste odpowiedzi pozostają wierszami zerowymi - nie trafiają do modeli
+        active_rows = [row for row, item in enumerate(items) if not self._is_trivial(item[1])]
+        active_items = [items[row] for row in active_rows]
+        if not active_items:
+            return AdvancedMetricsBatch(scores)
+        
+        sentences_batch = self._batch_response_sentences([item[1] for item in active_items])
+        
+        texts = []
+        for (query, response, context, ground_truth), sentences in zip(active_items, sentences_batch):
+            texts.extend(self._collect_metric_texts(query, response, context, ground_truth, sentences))
+        embeddings = self._embed_metric_texts(texts)
+        
+        # Po kodowaniu metryki przykładów tylko czytają wspólne embeddingi - można je liczyć równolegle
+        def compute_row(item):
+            (query, response, context, ground_truth), sentences = item
+            return astuple(self._compute_metrics(query, response, context, ground_truth, sentences, embeddings))
+        
+        jobs = zip(active_items, sentences_batch)
+        if METRIC_WORKERS > 1 and len(active_items) > 1:
+            # Pula tworzona na czas partii - wątki kończą się razem z wywołaniem
+            with ThreadPoolExecutor(max_workers=min(METRIC_WORKERS, len(active_items))) as executor:
+                rows = list(executor.map(compute_row, jobs))
+        else:
+            rows = map(compute_row, jobs)
+        
+        for row, values in zip(active_rows, rows):
+            scores[row] = values
+        
+        return AdvancedMetricsBatch(scores)
+    
+    @staticmethod
+    def _is_trivial(response: str) -> bool:
+        """Czy odpowiedź jest pusta (brak treści do oceny)"""
+        return not response or not response.strip()
+    
+    def _compute_metrics(
+        self,
+        query: str,
+        response: str,
+        context: Dict[str, Any],
+        ground_truth: List[str],
+        sentences: Optional[List[str]],
+        embeddings: Optional[Dict[str, np.ndarray]]
+    ) -> AdvancedMetrics:
+        """Oblicza metryki z wcześniej wyznaczonymi zdaniami odpowiedzi i embeddingami"""
         try:
+            # Podobieństwa odpowiedzi do kontekstu, fragmentów, zapytania i ground truth -
+            # wspólne dla kilku metryk, liczone jednym mnożeniem macierz-wektor
+            contents = [f.get("content", "") for f in (context or {}).get("fragments", [])]
+            similarities = self._response_similarities(
+                response, [" ".join(contents), *contents, query, *(ground_truth or [])], embeddings
+            )
+            
             # Wykrywanie halucynacji
-            hallucination_score = self._detect_hallucinations(response, context)
+            hallucination_score = self._detect_hallucinations(response, context, embeddings, similarities)
             
             # Dokładność faktyczna
-            factual_accuracy = self._calculate_factual_accuracy(response, ground_truth)
+            factual_accuracy = self._calculate_factual_accuracy(response, ground_truth, embeddings, similarities)
             
             # Wykorzystanie kontekstu
-            context_utilization = self._calculate_context_utilization(response, context)
+            context_utilization = self._calculate_context_utilization(response, context, embeddings, similarities)
             
             # Jakość odpowiedzi
             response_quality = self._calculate_response_quality(response)
             
             # Spójność
-            coherence_score = self._calculate_coherence(response)
+            coherence_score = self._calculate_coherence(response, embeddings, sentences)
             
             # Płynność
             fluency_score = self._calculate_fluency(response)
             
             # Specyficzność
-            specificity_score = self._calculate_specificity(response, query)
+            specificity_score = self._calculate_specificity(response, query, embeddings, similarities)
             
             # Kompletność
-            completeness_score = self._calculate_completeness(response, ground_truth)
+            completeness_score = self._calculate_completeness(response, ground_truth, embeddings, similarities)
             
             return AdvancedMetrics(
                 hallucination_score=hallucination_score,
@@ -134,24 +386,195 @@ class AdvancedEvaluator:
             
         except Exception as e:
             logger.error(f"Błąd obliczania zaawansowanych metryk: {e}")
-            return AdvancedMetrics(
-                hallucination_score=0.0,
-                factual_accuracy=0.0,
-                context_utilization=0.0,
-                response_quality=0.0,
-                coherence_score=0.0,
-                fluency_score=0.0,
-                specificity_score=0.0,
-                completeness_score=0.0
-            )
+            return AdvancedMetrics.zero()
+    
+    def _response_sentences(self, response: str) -> Optional[List[str]]:
+        """Dzieli odpowiedź na zdania modelem spaCy; None gdy model jest niedostępny lub zawiedzie"""
+        if not response or not self.nlp:
+            return None
+        
+        try:
+            return [sent.text for sent in self.nlp(response).sents]
+        except Exception as e:
+            logger.error(f"Błąd podziału odpowiedzi na zdania: {e}")
+            return None
+    
+    def _batch_response_sentences(self, responses: List[str]) -> List[Optional[List[str]]]:
+        """Dzieli wiele odpowiedzi na zdania jednym strumieniem nlp.pipe"""
+        if not self.nlp:
+            return [None] * len(responses)
+        
+        try:
+            docs = self.nlp.pipe((response or "" for response in responses), batch_size=SPACY_BATCH_SIZE)
+            return [
+                [sent.text for sent in doc.sents] if response else None
+                for response, doc in zip(responses, docs)
+            ]
+        except Exception as e:
+            logger.error(f"Błąd podziału odpowiedzi na zdania: {e}")
+            return [None] * len(responses)
+    
+    @staticmethod
+    def _collect_metric_texts(
+        query: str,
+        response: str,
+        context: Dict[str, Any],
+        ground_truth: List[str],
+        sentences: Optional[List[str]]
+    ) -> List[str]:
+        """Zbiera wszystkie teksty, których embeddingi są potrzebne metrykom jednego przykładu"""
+        fragments = (context or {}).get("fragments", [])
+        contents = [f.get("content", "") for f in fragments]
+        return [query, response, " ".join(contents), *contents, *(ground_truth or []), *(sentences or [])]
     
-    def _detect_hallucinations(self, response: str, context: Dict[str, Any]) -> float:
+    def _embed_metric_texts(self, texts: List[str]) -> Optional[Dict[str, np.ndarray]]:
+        """
+        Koduje jednym wywołaniem modelu wszystkie teksty potrzebne metrykom
+        
+        Returns:
+            Słownik tekst -> embedding lub None (brak modelu / błąd - metryki kodują samodzielnie)
+        """
+        if not self.embedding_model:
+            return None
+        
+        try:
+            return self._embed_texts(texts)
+        except Exception as e:
+            logger.error(f"Błąd wsadowego kodowania tekstów: {e}")
+            return None
+    
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        """Koduje teksty jednym wsadowym wywołaniem modelu; embeddingi są znormalizowane (L2), float32"""
+        # Bardzo długie teksty (np. połączony kontekst) przycinamy, aby nie tokenizować
+        # treści, która i tak wypadłaby poza okno modelu
+        max_seq_length = getattr(self.embedding_model, "max_seq_length", None)
+        if max_seq_length:
+            max_chars = max_seq_length * MAX_CHARS_PER_TOKEN
+            texts = [text[:max_chars] for text in texts]
+        
+        embeddings = self.embedding_model.encode(
+            texts,
+            batch_size=64,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        )
+        # Wszystkie dalsze obliczenia (macierz-wektor) zakładają float32;
+        # backendy zwracające inną precyzję są rzutowane tutaj, raz
+        return np.asarray(embeddings, dtype=np.float32)
+    
+    def _embed_texts(self, texts: List[str]) -> Dict[str, np.ndarray]:
+        """
+        Koduje unikalne teksty; zwraca słownik tekst -> embedding
+        
+        Embeddingi są pobierane z pamięci podręcznej (LRU w pamięci, opcjonalnie dysk),
+        a model koduje jednym wywołaniem wyłącznie brakujące teksty. Zwracane wektory
+        są współdzielone z pamięcią podręczną i nie mogą być modyfikowane w miejscu.
+        
+        Klucze to skróty treści, więc fragmenty kontekstu powtarzające się między
+        ewaluacjami (ten sam korpus dla wielu zapytań) są kodowane tylko raz.
+        """
+        unique_texts = [text for text in dict.fromkeys(texts) if text is not None]
+        
+        result = {}
+        misses = []
+        miss_keys = []
+        for text in unique_texts:
+            key = self._cache_key(text)
+            vector = self._embedding_cache.get(key)
+            if vector is not None:
+                self._embedding_cache.move_to_end(key)
+                result[text] = vector
+                continue
+            
+            if self._disk_cache is not None:
+                vector = self._disk_cache.get(key)
+                if vector is not None:
+                    result[text] = self._remember_embedding(key, vector)
+                    continue
+            
+            misses.append(text)
+            miss_keys.append(key)
+        
+        if misses:
+            vectors = self._encode_batch(misses)
+            for text, key, vector in zip(misses, miss_keys, vectors):
+                result[text] = self._remember_embedding(key, vector)
+            
+            if self._disk_cache is not None:
+                with self._disk_cache.transact():
+                    for key, vector in zip(miss_keys, vectors):
+                        self._disk_cache.set(key, vector)
+        
+        return result
+    
+    def _cache_key(self, text: str) -> str:
+        """Stabilny między uruchomieniami klucz embeddingu - skrót identyfikatora modelu i treści"""
+        return hashlib.blake2b(
+            f"{self._embedding_model_id}\0{text}".encode("utf-8"), digest_size=16
+        ).hexdigest()
+    
+    def _remember_embedding(self, key: str, vector: np.ndarray) -> np.ndarray:
+        """Zapisuje embedding (float32) w pamięci podręcznej LRU o ograniczonym rozmiarze; zwraca go"""
+        vector = np.asarray(vector, dtype=np.float32)
+        self._embedding_cache[key] = vector
+        self._embedding_cache.move_to_end(key)
+        if len(self._embedding_cache) > EMBEDDING_CACHE_SIZE:
+            self._embedding_cache.popitem(last=False)
+        return vector
+    
+    def _get_embeddings(
+        self, texts: List[str], embeddings: Optional[Dict[str, np.ndarray]]
+    ) -> Dict[str, np.ndarray]:
+        """Zwraca embeddingi tekstów, kodując je tylko gdy brak ich w przekazanym słowniku"""
+        if embeddings is not None and all(text in embeddings for text in texts):
+            return embeddings
+        return self._embed_texts(texts)
+    
+    def _response_similarities(
+        self, response: str, texts: List[str], embeddings: Optional[Dict[str, np.ndarray]]
+    ) -> Optional[Dict[str, float]]:
+        """Podobieństwa odpowiedzi do wielu tekstów jednym mnożeniem macierz-wektor; None bez embeddingów"""
+        if not response or embeddings is None or response not in embeddings:
+            return None
+        
+        others = [text for text in dict.fromkeys(texts) if text in embeddings]
+        if not others:
+            return {}
+        
+        similarities = np.stack([embeddings[other] for other in others]) @ embeddings[response]
+        return dict(zip(others, similarities.tolist()))
+    
+    def _similarities_to(
+        self,
+        text: str,
+        others: List[str],
+        embeddings: Optional[Dict[str, np.ndarray]] = None,
+        similarities: Optional[Dict[str, float]] = None
+    ) -> np.ndarray:
+        """Podobieństwa tekstu do listy tekstów - z wcześniej obliczonych wartości lub jednym mnożeniem macierz-wektor"""
+        if similarities is not None and all(other in similarities for other in others):
+            return np.array([similarities[other] for other in others], dtype=np.float32)
+        
+        embeddings = self._get_embeddings([text, *others], embeddings)
+        matrix = np.stack([embeddings[other] for other in others])
+        return matrix @ embeddings[text]
+    
+    def _detect_hallucinations(
+        self,
+        response: str,
+        context: Dict[str, Any],
+        embeddings: Optional[Dict[str, np.ndarray]] = None,
+        similarities: Optional[Dict[str, float]] = None
+    ) -> float:
         """
         Wykrywa halucynacje w odpowiedzi
         
         Args:
             response: Odpowiedź do analizy
             context: Kontekst wykorzystany
+            embeddings: Opcjonalne, wcześniej obliczone embeddingi tekstów
+            similarities: Opcjonalne, wcześniej obliczone podobieństwa tekstów do odpowiedzi
             
         Returns:
             Wskaźnik halucynacji (0-1, gdzie 1 = brak halucynacji)
@@ -170,18 +593,15 @@ class AdvancedEvaluator:
         # Sprawdź podobieństwo semantyczne
         if self.embedding_model:
             try:
-                response_embedding = self.embedding_model.encode([response])
-                context_embedding = self.embedding_model.encode([context_text])
-                
-                similarity = cosine_similarity(response_embedding, context_embedding)[0][0]
+                similarity = float(self._similarities_to(response, [context_text], embeddings, similarities)[0])
                 
                 # Sprawdź wskaźniki halucynacji
-                hallucination_indicators = sum(1 for indicator in self.hallucination_indicators 
-                                             if indicator.lower() in response.lower())
+                hallucination_indicators = len(set(self._indicator_pattern.findall(response.lower())))
                 
-                # Sprawdź wzorce halucynacji
-                hallucination_patterns = sum(1 for pattern in self.hallucination_patterns 
-                                          if re.search(pattern, response))
+                # Sprawdź wzorce halucynacji (każdy wymaga cyfry - bez cyfr pomijamy skanowanie)
+                hallucination_patterns = len({
+                    match.lastgroup for match in self.hallucination_pattern.finditer(response)
+                }) if any(ch.isdigit() for ch in response) else 0
                 
                 # Oblicz wskaźnik halucynacji
                 hallucination_score = similarity * (1 - hallucination_indicators * 0.1) * (1 - hallucination_patterns * 0.05)
@@ -195,13 +615,21 @@ class AdvancedEvaluator:
         # Fallback na podobieństwo tokenów
         return self._calculate_token_similarity(response, context_text)
     
-    def _calculate_factual_accuracy(self, response: str, ground_truth: List[str]) -> float:
+    def _calculate_factual_accuracy(
+        self,
+        response: str,
+        ground_truth: List[str],
+        embeddings: Optional[Dict[str, np.ndarray]] = None,
+        similarities: Optional[Dict[str, float]] = None
+    ) -> float:
         """
         Oblicza dokładność faktyczną
         
         Args:
             response: Odpowiedź do analizy
             ground_truth: Prawdziwe odpowiedzi
+            embeddings: Opcjonalne, wcześniej obliczone embeddingi tekstów
+            similarities: Opcjonalne, wcześniej obliczone podobieństwa tekstów do odpowiedzi
             
         Returns:
             Dokładność faktyczna (0-1)
@@ -210,32 +638,31 @@ class AdvancedEvaluator:
             return 0.0
         
         # Sprawdź czy odpowiedź zawiera informacje z ground truth
-        max_similarity = 0.0
-        
-        for gt in ground_truth:
-            if self.embedding_model:
-                try:
-                    response_embedding = self.embedding_model.encode([response])
-                    gt_embedding = self.embedding_model.encode([gt])
-                    
-                    similarity = cosine_similarity(response_embedding, gt_embedding)[0][0]
-                    max_similarity = max(max_similarity, similarity)
-                except Exception:
-                    similarity = self._calculate_token_similarity(response, gt)
-                    max_similarity = max(max_similarity, similarity)
-            else:
-                similarity = self._calculate_token_similarity(response, gt)
-                max_similarity = max(max_similarity, similarity)
+        if self.embedding_model:
+            try:
+                gt_similarities = self._similarities_to(response, ground_truth, embeddings, similarities)
+                return max(0.0, min(1.0, float(gt_similarities.max())))
+            except Exception:
+                pass
         
-        return max_similarity
+        similarities = [self._calculate_token_similarity(response, gt) for gt in ground_truth]
+        return max(0.0, max(similarities))
     
-    def _calculate_context_utilization(self, response: str, context: Dict[str, Any]) -> float:
+    def _calculate_context_utilization(
+        self,
+        response: str,
+        context: Dict[str, Any],
+        embeddings: Optional[Dict[str, np.ndarray]] = None,
+        similarities: Optional[Dict[str, float]] = None
+    ) -> float:
         """
         Oblicza wykorzystanie kontekstu
         
         Args:
             response: Odpowiedź do analizy
             context: Kontekst wykorzystany
+            embeddings: Opcjonalne, wcześniej obliczone embeddingi tekstów
+            similarities: Opcjonalne, wcześniej obliczone podobieństwa tekstów do odpowiedzi
             
         Returns:
             Wykorzystanie kontekstu (0-1)
@@ -248,37 +675,25 @@ class AdvancedEvaluator:
         if not fragments:
             return 0.0
         
-        # Sprawdź ile fragmentów jest wykorzystanych
-        utilized_fragments = 0
-        
-        for fragment in fragments:
-            content = fragment.get("content", "")
-            if content:
-                # Sprawdź czy fragment jest wykorzystany w odpowiedzi
-                if self._is_fragment_utilized(response, content):
-                    utilized_fragments += 1
-        
-        return utilized_fragments / len(fragments) if fragments else 0.0
-    
-    def _is_fragment_utilized(self, response: str, fragment: str) -> bool:
-        """Sprawdza czy fragment jest wykorzystany w odpowiedzi"""
-        if not response or not fragment:
-            return False
+        # Puste fragmenty nie mogą być wykorzystane, ale liczą się do mianownika
+        contents = [f.get("content", "") for f in fragments]
+        contents = [content for content in contents if content]
+        if not contents:
+            return 0.0
         
-        # Sprawdź podobieństwo semantyczne
+        # Sprawdź podobieństwo semantyczne - wszystkie fragmenty jednym mnożeniem macierz-wektor
         if self.embedding_model:
             try:
-                response_embedding = self.embedding_model.encode([response])
-                fragment_embedding = self.embedding_model.encode([fragment])
-                
-                similarity = cosine_similarity(response_embedding, fragment_embedding)[0][0]
-                return similarity > 0.7  # Próg wykorzystania
+                fragment_similarities = self._similarities_to(response, contents, embeddings, similarities)
+                return int((fragment_similarities > 0.7).sum()) / len(fragments)  # Próg wykorzystania
             except Exception:
                 pass
         
         # Fallback na podobieństwo tokenów
-        similarity = self._calculate_token_similarity(response, fragment)
-        return similarity > 0.5
+        utilized_fragments = sum(
+            1 for content in contents if self._calculate_token_similarity(response, content) > 0.5
+        )
+        return utilized_fragments / len(fragments)
     
     def _calculate_response_quality(self, response: str) -> float:
         """
@@ -344,37 +759,37 @@ class AdvancedEvaluator:
         else:
             return 0.4
     
-    def _calculate_coherence(self, response: str) -> float:
-        """Oblicza spójność odpowiedzi"""
+    def _calculate_coherence(
+        self,
+        response: str,
+        embeddings: Optional[Dict[str, np.ndarray]] = None,
+        sentences: Optional[List[str]] = None
+    ) -> float:
+        """Oblicza spójność odpowiedzi (opcjonalnie z wcześniej wyznaczonymi zdaniami i embeddingami)"""
         if not response or not self.nlp:
             return 0.0
         
         try:
-            doc = self.nlp(response)
-            
             # Sprawdź spójność semantyczną
-            sentences = [sent.text for sent in doc.sents]
+            if sentences is None:
+                sentences = [sent.text for sent in self.nlp(response).sents]
             if len(sentences) < 2:
                 return 1.0
             
-            # Oblicz podobieństwo między zdaniami
-            similarities = []
-            for i in range(len(sentences) - 1):
-                if self.embedding_model:
-                    try:
-                        sent1_embedding = self.embedding_model.encode([sentences[i]])
-                        sent2_embedding = self.embedding_model.encode([sentences[i + 1]])
-                        
-                        similarity = cosine_similarity(sent1_embedding, sent2_embedding)[0][0]
-                        similarities.append(similarity)
-                    except Exception:
-                        similarity = self._calculate_token_similarity(sentences[i], sentences[i + 1])
-                        similarities.append(similarity)
-                else:
-                    similarity = self._calculate_token_similarity(sentences[i], sentences[i + 1])
-                    similarities.append(similarity)
+            # Podobieństwo sąsiednich zdań - iloczyny skalarne wierszy macierzy embeddingów
+            if self.embedding_model:
+                try:
+                    embeddings = self._get_embeddings(sentences, embeddings)
+                    matrix = np.stack([embeddings[sentence] for sentence in sentences])
+                    return float(np.einsum('ij,ij->i', matrix[:-1], matrix[1:]).mean())
+                except Exception:
+                    pass
             
-            return np.mean(similarities) if similarities else 0.0
+            similarities = [
+                self._calculate_token_similarity(sentences[i], sentences[i + 1])
+                for i in range(len(sentences) - 1)
+            ]
+            return fmean(similarities) if similarities else 0.0
             
         except Exception as e:
             logger.error(f"Błąd obliczania spójności: {e}")
@@ -386,20 +801,20 @@ class AdvancedEvaluator:
             return 0.0
         
         # Sprawdź płynność na podstawie wzorców językowych
-        fluency_indicators = [
-            r'\b(ale|jednak|ponadto|dodatkowo|więc|zatem)\b',  # Spójniki
-            r'\b(przede wszystkim|po pierwsze|po drugie)\b',  # Struktura
-            r'\b(na przykład|na przykład|czyli)\b',  # Przykłady
-        ]
-        
         fluency_score = 0.0
-        for pattern in fluency_indicators:
-            matches = len(re.findall(pattern, response, re.IGNORECASE))
+        for pattern in self.fluency_patterns:
+            matches = len(pattern.findall(response))
             fluency_score += min(1.0, matches / 3)  # Normalizacja
         
-        return min(1.0, fluency_score / len(fluency_indicators))
+        return min(1.0, fluency_score / len(self.fluency_patterns))
     
-    def _calculate_specificity(self, response: str, query: str) -> float:
+    def _calculate_specificity(
+        self,
+        response: str,
+        query: str,
+        embeddings: Optional[Dict[str, np.ndarray]] = None,
+        similarities: Optional[Dict[str, float]] = None
+    ) -> float:
         """Oblicza specyficzność odpowiedzi względem zapytania"""
         if not response or not query:
             return 0.0
@@ -407,55 +822,47 @@ class AdvancedEvaluator:
         # Sprawdź czy odpowiedź jest specyficzna dla zapytania
         if self.embedding_model:
             try:
-                response_embedding = self.embedding_model.encode([response])
-                query_embedding = self.embedding_model.encode([query])
-                
-                similarity = cosine_similarity(response_embedding, query_embedding)[0][0]
-                return similarity
+                return float(self._similarities_to(response, [query], embeddings, similarities)[0])
             except Exception:
                 pass
         
         # Fallback na podobieństwo tokenów
         return self._calculate_token_similarity(response, query)
     
-    def _calculate_completeness(self, response: str, ground_truth: List[str]) -> float:
+    def _calculate_completeness(
+        self,
+        response: str,
+        ground_truth: List[str],
+        embeddings: Optional[Dict[str, np.ndarray]] = None,
+        similarities: Optional[Dict[str, float]] = None
+    ) -> float:
         """Oblicza kompletność odpowiedzi"""
         if not response or not ground_truth:
             return 0.0
         
         # Sprawdź czy odpowiedź pokrywa wszystkie aspekty ground truth
-        coverage_scores = []
-        
-        for gt in ground_truth:
-            if self.embedding_model:
-                try:
-                    response_embedding = self.embedding_model.encode([response])
-                    gt_embedding = self.embedding_model.encode([gt])
-                    
-                    similarity = cosine_similarity(response_embedding, gt_embedding)[0][0]
-                    coverage_scores.append(similarity)
-                except Exception:
-                    similarity = self._calculate_token_similarity(response, gt)
-                    coverage_scores.append(similarity)
-            else:
-                similarity = self._calculate_token_similarity(response, gt)
-                coverage_scores.append(similarity)
+        if self.embedding_model:
+            try:
+                return float(self._similarities_to(response, ground_truth, embeddings, similarities).mean())
+            except Exception:
+                pass
         
-        return np.mean(coverage_scores) if coverage_scores else 0.0
+        coverage_scores = [self._calculate_token_similarity(response, gt) for gt in ground_truth]
+        return fmean(coverage_scores) if coverage_scores else 0.0
     
     def _calculate_token_similarity(self, text1: str, text2: str) -> float:
         """Oblicza podobieństwo na podstawie tokenów"""
         if not text1 or not text2:
             return 0.0
         
-        tokens1 = set(text1.lower().split())
-        tokens2 = set(text2.lower().split())
+        tokens1 = _token_set(text1)
+        tokens2 = _token_set(text2)
         
         if not tokens1 or not tokens2:
             return 0.0
         
-        intersection = len(tokens1.intersection(tokens2))
-        union = len(tokens1.union(tokens2))
+        intersection = len(tokens1 & tokens2)
+        union = len(tokens1) + len(tokens2) - intersection
         
         return intersection / union if union > 0 else 0.0
     
@@ -479,32 +886,17 @@ class AdvancedEvaluator:
             quality_level = "Poor"
         
         # Rekomendacje
-        recommendations = []
-        
-        if metrics.hallucination_score < 0.7:
-            recommendations.append("Zwiększ weryfikację faktów w odpowiedzi")
-        
-        if metrics.context_utilization < 0.6:
-            recommendations.append("Lepiej wykorzystuj dostępny kontekst")
-        
-        if metrics.coherence_score < 0.7:
-            recommendations.append("Popraw spójność odpowiedzi")
+        recommendations = [
+            recommendation
+            for column, threshold, recommendation in QUALITY_RECOMMENDATIONS
+            if getattr(metrics, column.name.lower()) < threshold
+        ]
         
-        if metrics.fluency_score < 0.6:
-            recommendations.append("Popraw płynność językową")
+        values = astuple(metrics)
         
         return {
             "quality_level": quality_level,
-            "overall_score": np.mean([
-                metrics.hallucination_score,
-                metrics.factual_accuracy,
-                metrics.context_utilization,
-                metrics.response_quality,
-                metrics.coherence_score,
-                metrics.fluency_score,
-                metrics.specificity_score,
-                metrics.completeness_score
-            ]),
+            "overall_score": sum(values) / len(values),
             "recommendations": recommendations,
             "detailed_metrics": {
                 "hallucination_score": metrics.hallucination_score,
@@ -517,6 +909,53 @@ class AdvancedEvaluator:
                 "completeness_score": metrics.completeness_score
             }
         }
+    
+    def generate_quality_report_batch(self, batch: AdvancedMetricsBatch) -> List[Dict[str, Any]]:
+        """
+        Generuje raporty jakości dla partii metryk
+        
+        Poziomy jakości, wyniki ogólne i progi rekomendacji są wyznaczane
+        operacjami na kolumnach macierzy metryk, bez iteracji po metrykach.
+        
+        Args:
+            batch: Partia zaawansowanych metryk
+            
+        Returns:
+            Raporty jakości w kolejności przykładów (format jak generate_quality_report)
+        """
+        scores = batch.scores
+        hallucination = batch.column(MetricColumn.HALLUCINATION_SCORE)
+        
+        quality_levels = np.select(
+            [hallucination < 0.4, hallucination < 0.6, hallucination < 0.8],
+            ["Poor", "Fair", "Good"],
+            default="Excellent"
+        ).tolist()
+        overall_scores = scores.mean(axis=1).tolist()
+        
+        # Maska (M, R): które rekomendacje dotyczą którego przykładu
+        recommendation_masks = np.stack(
+            [batch.column(column) < threshold for column, threshold, _ in QUALITY_RECOMMENDATIONS],
+            axis=1
+        ).tolist()
+        
+        metric_names = [column.name.lower() for column in MetricColumn]
+        
+        return [
+            {
+                "quality_level": quality_level,
+                "overall_score": overall_score,
+                "recommendations": [
+                    recommendation
+                    for (_, _, recommendation), applies in zip(QUALITY_RECOMMENDATIONS, mask)
+                    if applies
+                ],
+                "detailed_metrics": dict(zip(metric_names, row))
+            }
+            for quality_level, overall_score, mask, row in zip(
+                quality_levels, overall_scores, recommendation_masks, scores.tolist()
+            )
+        ]
 
 
 # Global instance
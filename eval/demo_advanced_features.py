@@ -7,18 +7,19 @@ Demonstracja zaawansowanych funkcjonalności systemu ewaluacji
 - Wizualizacje
 """
 
+import importlib.util
+import io
 import logging
-import json
-import pandas as pd
+import sys
+from contextlib import contextmanager, redirect_stdout
 import numpy as np
 from datetime import datetime, timedelta
-from pathlib import Path
-import matplotlib.pyplot as plt
-import seaborn as sns
+from functools import cached_property
+from typing import TYPE_CHECKING
 
-from advanced_metrics import AdvancedEvaluator
-from literature_comparison import LiteratureComparator
-from trend_analysis import TrendAnalyzer
+if TYPE_CHECKING:
+    import pandas as pd
+    from matplotlib.figure import Figure
 
 # Konfiguracja logowania
 logging.basicConfig(
@@ -27,20 +28,142 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Ziarno generatora danych syntetycznych - każda demonstracja jest powtarzalna
+RANDOM_SEED = 42
+
+# Kierunek zmiany względem literatury indeksowany znakiem różnicy + 1 (-1, 0, 1)
+DELTA_DIRECTION_EMOJI = ("📉", "➡️", "📈")
+
+# Oznaczenia kierunków trendów z TrendAnalyzer
+TREND_DIRECTION_EMOJI = {
+    "strong_increase": "📈📈",
+    "moderate_increase": "📈",
+    "stable": "➡️",
+    "moderate_decrease": "📉",
+    "strong_decrease": "📉📉"
+}
+
+# Rozdzielczość zapisywanych wykresów - 150 DPI wystarcza do podglądu na ekranie
+CHART_DPI = 150
+
+
+@contextmanager
+def buffered_output():
+    """Zbiera wyjście sekcji demonstracji i wypisuje je jednym zapisem (także po błędzie)"""
+    buffer = io.StringIO()
+    try:
+        with redirect_stdout(buffer):
+            yield
+    finally:
+        sys.stdout.write(buffer.getvalue())
+
+
+# Biblioteki wykresów (matplotlib, seaborn, pandas) są importowane dopiero przy
+# wizualizacjach - pozostałe demonstracje nie płacą za ich import
+
+def _pyplot():
+    """Importuje pyplot z backendem Agg - wykresy zapisywane wyłącznie do plików"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def render_policy_comparison(fig: "Figure", pivot_df: "pd.DataFrame", path: str):
+    """Wykres 1: Porównanie polityk"""
+    fig.clear()
+    fig.set_size_inches(12, 8)
+    ax = fig.add_subplot()
+    
+    # Słupki grupowane: metryki na osi X, po jednym słupku na politykę
+    positions = np.arange(len(pivot_df.index))
+    width = 0.8 / len(pivot_df.columns)
+    for i, policy in enumerate(pivot_df.columns):
+        ax.bar(positions + i * width, pivot_df[policy].to_numpy(), width, label=policy)
+    ax.set_xticks(positions + width * (len(pivot_df.columns) - 1) / 2)
+    ax.set_xticklabels(pivot_df.index)
+    ax.set_title('Porównanie wydajności polityk RAG', fontsize=16, fontweight='bold')
+    ax.set_xlabel('Metryki', fontsize=12)
+    ax.set_ylabel('Wartość', fontsize=12)
+    ax.legend(title='Polityka', bbox_to_anchor=(1.05, 1), loc='upper left')
+    ax.tick_params(axis='x', labelrotation=45)
+    ax.grid(True, alpha=0.3)
+    fig.tight_layout()
+    fig.savefig(path, dpi=CHART_DPI, bbox_inches='tight')
+
+
+def render_correlation_heatmap(fig: "Figure", pivot_df: "pd.DataFrame", path: str):
+    """Wykres 2: Heatmapa korelacji"""
+    import pandas as pd
+    import seaborn as sns
+    
+    # Pełna siatka metryka x polityka (bez braków) - korelacja kolumn jednym np.corrcoef
+    correlation_matrix = pd.DataFrame(
+        np.corrcoef(pivot_df.to_numpy().T), index=pivot_df.columns, columns=pivot_df.columns
+    )
+    
+    fig.clear()
+    fig.set_size_inches(10, 8)
+    ax = fig.add_subplot()
+    sns.heatmap(correlation_matrix, annot=True, cmap='coolwarm', center=0,
+               square=True, fmt='.3f', ax=ax)
+    ax.set_title('Korelacja między politykami RAG', fontsize=16, fontweight='bold')
+    fig.tight_layout()
+    fig.savefig(path, dpi=CHART_DPI, bbox_inches='tight')
+
+
+def render_metrics_distribution(fig: "Figure", df: "pd.DataFrame", metrics: list, policies: list, path: str):
+    """Wykres 3: Rozkład metryk"""
+    # Wartości każdej pary (metryka, polityka) wyznaczone jednym grupowaniem
+    groups = {key: values.to_numpy() for key, values in df.groupby(['metric', 'policy'])['value']}
+    
+    fig.clear()
+    fig.set_size_inches(12, 8)
+    axes = fig.subplots(2, 2)
+    for ax, metric in zip(axes.flat, metrics):
+        # Wszystkie polityki jednym wywołaniem - wspólne przedziały histogramu
+        policy_values = [groups[(metric, policy)] for policy in policies]
+        ax.hist(policy_values, alpha=0.7, label=policies, bins=10)
+        
+        ax.set_title(f'Rozkład {metric}', fontweight='bold')
+        ax.set_xlabel('Wartość')
+        ax.set_ylabel('Częstość')
+        ax.legend()
+        ax.grid(True, alpha=0.3)
+    
+    fig.suptitle('Rozkład metryk dla różnych polityk', fontsize=16, fontweight='bold')
+    fig.tight_layout()
+    fig.savefig(path, dpi=CHART_DPI, bbox_inches='tight')
+
 
 class AdvancedFeaturesDemo:
-    """Demonstracja zaawansowanych funkcjonalności"""
+    """Demonstracja zaawansowanych funkcjonalności
     
-    def __init__(self):
-        self.advanced_evaluator = AdvancedEvaluator()
-        self.literature_comparator = LiteratureComparator()
-        self.trend_analyzer = TrendAnalyzer()
-        
-        # Przykładowe dane
-        self.sample_data = self._generate_sample_data()
+    Komponenty i przykładowe dane są tworzone przy pierwszym użyciu - demonstracja
+    pojedynczej funkcjonalności nie ładuje modeli pozostałych.
+    """
+    
+    @cached_property
+    def advanced_evaluator(self):
+        """Ewaluator zaawansowanych metryk"""
+        from advanced_metrics import AdvancedEvaluator
+        return AdvancedEvaluator()
     
-    def _generate_sample_data(self) -> dict:
-        """Generuje przykładowe dane do demonstracji"""
+    @cached_property
+    def literature_comparator(self):
+        """Komparator wyników z literaturą"""
+        from literature_comparison import LiteratureComparator
+        return LiteratureComparator()
+    
+    @cached_property
+    def trend_analyzer(self):
+        """Analizator trendów"""
+        from trend_analysis import TrendAnalyzer
+        return TrendAnalyzer()
+    
+    @cached_property
+    def sample_data(self) -> dict:
+        """Przykładowe dane do demonstracji"""
         return {
             "queries": [
                 {
@@ -68,6 +191,7 @@ class AdvancedFeaturesDemo:
             ]
         }
     
+    @buffered_output()
     def demo_advanced_metrics(self):
         """Demonstracja zaawansowanych metryk"""
         logger.info("🎯 Demonstracja zaawansowanych metryk")
@@ -76,18 +200,23 @@ class AdvancedFeaturesDemo:
         print("📊 ZAAWANSOWANE METRYKI EWALUACJI")
         print("="*60)
         
-        for i, query_data in enumerate(self.sample_data["queries"], 1):
+        queries = self.sample_data["queries"]
+        
+        # Oblicz zaawansowane metryki wszystkich zapytań jednym wywołaniem (wspólne kodowanie)
+        metrics_batch = self.advanced_evaluator.calculate_advanced_metrics_batch(
+            queries=[query_data["query"] for query_data in queries],
+            responses=[query_data["response"] for query_data in queries],
+            contexts=[query_data["context"] for query_data in queries],
+            ground_truths=[query_data["ground_truth"] for query_data in queries]
+        )
+        quality_reports = self.advanced_evaluator.generate_quality_report_batch(metrics_batch)
+        
+        for i, (query_data, advanced_metrics, quality_report) in enumerate(
+            zip(queries, metrics_batch, quality_reports), 1
+        ):
             print(f"\n📋 Zapytanie {i}: {query_data['query']}")
             print(f"💬 Odpowiedź: {query_data['response']}")
             
-            # Oblicz zaawansowane metryki
-            advanced_metrics = self.advanced_evaluator.calculate_advanced_metrics(
-                query=query_data["query"],
-                response=query_data["response"],
-                context=query_data["context"],
-                ground_truth=query_data["ground_truth"]
-            )
-            
             # Wyświetl metryki
             print(f"\n📈 Metryki zaawansowane:")
             print(f"  🎯 Hallucination Score: {advanced_metrics.hallucination_score:.3f}")
@@ -99,13 +228,13 @@ class AdvancedFeaturesDemo:
             print(f"  🎯 Specificity Score: {advanced_metrics.specificity_score:.3f}")
             print(f"  📝 Completeness Score: {advanced_metrics.completeness_score:.3f}")
             
-            # Generuj raport jakości
-            quality_report = self.advanced_evaluator.generate_quality_report(advanced_metrics)
+            # Raport jakości
             print(f"\n📊 Raport jakości:")
             print(f"  🏆 Poziom jakości: {quality_report['quality_level']}")
             print(f"  📈 Ogólny wynik: {quality_report['overall_score']:.3f}")
             print(f"  💡 Rekomendacje: {', '.join(quality_report['recommendations'])}")
     
+    @buffered_output()
     def demo_literature_comparison(self):
         """Demonstracja porównania z literaturą"""
         logger.info("📚 Demonstracja porównania z literaturą")
@@ -152,9 +281,14 @@ class AdvancedFeaturesDemo:
         print(f"\n📈 Porównanie z literaturą:")
         for policy, deltas in comparison_result.comparison_metrics.items():
             print(f"\n🔧 {policy}:")
-            for metric, delta in deltas.items():
-                direction = "📈" if delta > 0 else "📉" if delta < 0 else "➡️"
-                print(f"  {metric}: {delta:+.1f}% {direction}")
+            if not deltas:
+                continue
+            delta_values = np.fromiter(deltas.values(), dtype=np.float64, count=len(deltas))
+            directions = (np.sign(np.nan_to_num(delta_values)).astype(int) + 1).tolist()
+            print("\n".join(
+                f"  {metric}: {delta:+.1f}% {DELTA_DIRECTION_EMOJI[direction]}"
+                for metric, delta, direction in zip(deltas, delta_values.tolist(), directions)
+            ))
         
         print(f"\n💡 Wnioski:")
         for insight in comparison_result.insights:
@@ -164,6 +298,7 @@ class AdvancedFeaturesDemo:
         for recommendation in comparison_result.recommendations:
             print(f"  • {recommendation}")
     
+    @buffered_output()
     def demo_trend_analysis(self):
         """Demonstracja analizy trendów"""
         logger.info("📈 Demonstracja analizy trendów")
@@ -173,43 +308,38 @@ class AdvancedFeaturesDemo:
         print("="*60)
         
         # Generuj przykładowe dane czasowe
-        base_time = datetime.now() - timedelta(days=30)
-        
-        for i in range(30):
-            timestamp = base_time + timedelta(days=i)
-            
-            # Symuluj trendy
-            for metric in ['relevance', 'utilization', 'adherence', 'completeness']:
-                # Trend wzrostowy z szumem
-                base_value = 0.7 + (i / 30) * 0.2  # Wzrost od 0.7 do 0.9
-                noise = np.random.normal(0, 0.05)
-                value = max(0, min(1, base_value + noise))
-                
-                self.trend_analyzer.add_data_point(
-                    timestamp=timestamp,
-                    metric=metric,
-                    value=value,
-                    policy="GraphRAG",
-                    domain="FinQA"
-                )
+        days = 30
+        metrics = ['relevance', 'utilization', 'adherence', 'completeness']
+        base_time = datetime.now() - timedelta(days=days)
+        timestamps = [base_time + timedelta(days=i) for i in range(days)]
+        
+        # Symuluj trendy: wzrost od 0.7 do 0.9 z szumem - wszystkie dni i metryki naraz
+        base_values = 0.7 + (np.arange(days) / days * 0.2)[:, None]
+        rng = np.random.default_rng(RANDOM_SEED)
+        noise = rng.normal(0, 0.05, size=(days, len(metrics)))
+        values = np.clip(base_values + noise, 0, 1)
+        
+        for column, metric in enumerate(metrics):
+            self.trend_analyzer.add_data_points(
+                timestamps=timestamps,
+                metric=metric,
+                values=values[:, column],
+                policy="GraphRAG",
+                domain="FinQA"
+            )
         
         # Analizuj trendy
         print(f"\n📊 Analiza trendów:")
-        for metric in ['relevance', 'utilization', 'adherence', 'completeness']:
-            trends = self.trend_analyzer.analyze_trends(metric, policy="GraphRAG", domain="FinQA")
-            
+        trends_by_metric = {
+            metric: self.trend_analyzer.analyze_trends(metric, policy="GraphRAG", domain="FinQA")
+            for metric in metrics
+        }
+        for metric, trends in trends_by_metric.items():
             if trends:
                 trend = trends[0]
-                direction_emoji = {
-                    "strong_increase": "📈📈",
-                    "moderate_increase": "📈",
-                    "stable": "➡️",
-                    "moderate_decrease": "📉",
-                    "strong_decrease": "📉📉"
-                }
                 
                 print(f"\n🔧 {metric}:")
-                print(f"  Kierunek: {direction_emoji.get(trend.trend_direction, '❓')} {trend.trend_direction}")
+                print(f"  Kierunek: {TREND_DIRECTION_EMOJI.get(trend.trend_direction, '❓')} {trend.trend_direction}")
                 print(f"  Siła: {trend.trend_strength:.3f}")
                 print(f"  Korelacja: {trend.correlation:.3f}")
                 if trend.prediction:
@@ -236,6 +366,7 @@ class AdvancedFeaturesDemo:
         print(f"  Metryki: {trend_report['summary']['metrics_analyzed']}")
         print(f"  Wzorce: {trend_report['summary']['patterns_detected']}")
     
+    @buffered_output()
     def demo_visualizations(self):
         """Demonstracja wizualizacji"""
         logger.info("📊 Demonstracja wizualizacji")
@@ -244,90 +375,50 @@ class AdvancedFeaturesDemo:
         print("📊 WIZUALIZACJE I WYKRESY")
         print("="*60)
         
+        import pandas as pd
+        
         # Generuj przykładowe dane
-        np.random.seed(42)
+        rng = np.random.default_rng(RANDOM_SEED)
         
         # Dane dla różnych polityk
         policies = ['TextRAG', 'FactRAG', 'GraphRAG', 'HybridRAG']
         metrics = ['relevance', 'utilization', 'adherence', 'completeness']
         
-        data = []
-        for policy in policies:
-            for metric in metrics:
-                # Symuluj różne wydajności
-                if policy == 'GraphRAG':
-                    base_value = 0.85
-                elif policy == 'FactRAG':
-                    base_value = 0.80
-                elif policy == 'TextRAG':
-                    base_value = 0.75
-                else:
-                    base_value = 0.78
-                
-                value = base_value + np.random.normal(0, 0.05)
-                value = max(0, min(1, value))
-                
-                data.append({
-                    'policy': policy,
-                    'metric': metric,
-                    'value': value
-                })
+        # Symuluj różne wydajności - jedno losowanie dla wszystkich par (polityka, metryka)
+        policy_base_values = {'GraphRAG': 0.85, 'FactRAG': 0.80, 'TextRAG': 0.75}
+        base_values = np.repeat([policy_base_values.get(policy, 0.78) for policy in policies], len(metrics))
+        values = np.clip(base_values + rng.normal(0, 0.05, size=base_values.size), 0, 1)
         
-        df = pd.DataFrame(data)
+        # Kolumny tekstowe w pamięci Arrow, gdy pyarrow jest dostępne
+        string_dtype = "string[pyarrow]" if importlib.util.find_spec("pyarrow") else None
+        df = pd.DataFrame({
+            'policy': pd.array(np.repeat(policies, len(metrics)), dtype=string_dtype),
+            'metric': pd.array(np.tile(metrics, len(policies)), dtype=string_dtype),
+            'value': values
+        })
         
-        # Wykres 1: Porównanie polityk
-        plt.figure(figsize=(12, 8))
         pivot_df = df.pivot(index='metric', columns='policy', values='value')
         
-        ax = pivot_df.plot(kind='bar', figsize=(12, 8))
-        plt.title('Porównanie wydajności polityk RAG', fontsize=16, fontweight='bold')
-        plt.xlabel('Metryki', fontsize=12)
-        plt.ylabel('Wartość', fontsize=12)
-        plt.legend(title='Polityka', bbox_to_anchor=(1.05, 1), loc='upper left')
-        plt.xticks(rotation=45)
-        plt.grid(True, alpha=0.3)
-        plt.tight_layout()
-        plt.savefig('policy_comparison.png', dpi=300, bbox_inches='tight')
-        plt.close()
-        
-        print("✅ Wykres porównania polityk zapisany jako 'policy_comparison.png'")
-        
-        # Wykres 2: Heatmapa korelacji
-        plt.figure(figsize=(10, 8))
-        correlation_matrix = pivot_df.corr()
-        
-        sns.heatmap(correlation_matrix, annot=True, cmap='coolwarm', center=0,
-                   square=True, fmt='.3f')
-        plt.title('Korelacja między politykami RAG', fontsize=16, fontweight='bold')
-        plt.tight_layout()
-        plt.savefig('correlation_heatmap.png', dpi=300, bbox_inches='tight')
-        plt.close()
-        
-        print("✅ Heatmapa korelacji zapisana jako 'correlation_heatmap.png'")
-        
-        # Wykres 3: Rozkład metryk
-        plt.figure(figsize=(12, 8))
-        
-        for i, metric in enumerate(metrics, 1):
-            plt.subplot(2, 2, i)
-            metric_data = df[df['metric'] == metric]
-            
-            for policy in policies:
-                policy_data = metric_data[metric_data['policy'] == policy]['value']
-                plt.hist(policy_data, alpha=0.7, label=policy, bins=10)
-            
-            plt.title(f'Rozkład {metric}', fontweight='bold')
-            plt.xlabel('Wartość')
-            plt.ylabel('Częstość')
-            plt.legend()
-            plt.grid(True, alpha=0.3)
-        
-        plt.suptitle('Rozkład metryk dla różnych polityk', fontsize=16, fontweight='bold')
-        plt.tight_layout()
-        plt.savefig('metrics_distribution.png', dpi=300, bbox_inches='tight')
-        plt.close()
-        
-        print("✅ Rozkład metryk zapisany jako 'metrics_distribution.png'")
+        charts = [
+            (render_policy_comparison, (pivot_df, 'policy_comparison.png'),
+             "✅ Wykres porównania polityk zapisany jako 'policy_comparison.png'"),
+            (render_correlation_heatmap, (pivot_df, 'correlation_heatmap.png'),
+             "✅ Heatmapa korelacji zapisana jako 'correlation_heatmap.png'"),
+            (render_metrics_distribution, (df, metrics, policies, 'metrics_distribution.png'),
+             "✅ Rozkład metryk zapisany jako 'metrics_distribution.png'"),
+        ]
+        
+        # Trzy małe wykresy renderowane w bieżącym procesie - fork po załadowaniu
+        # torch/spaCy grozi zakleszczeniem, a spawn ponownie importowałby biblioteki wykresów.
+        # Jedna figura współdzielona przez wszystkie wykresy - każdy ją czyści i zapisuje
+        plt = _pyplot()
+        fig = plt.figure()
+        try:
+            for render, args, message in charts:
+                render(fig, *args)
+                print(message)
+        finally:
+            plt.close(fig)
     
     def run_full_demo(self):
         """Uruchamia pełną demonstrację"""
@@ -5,19 +5,31 @@ Porównuje wyniki RAGBench + FinanceBench z wnioskami
 """
 
 import os
+import importlib.util
 import sys
 import json
 import logging
+import warnings
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import TYPE_CHECKING, Callable, Dict, List, Any, Optional, Tuple
 from datetime import datetime
-import plotly.graph_objects as go
-import plotly.express as px
-from plotly.subplots import make_subplots
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+if TYPE_CHECKING:
+    from matplotlib.figure import Figure
+
+try:
+    import polars as pl
+except ImportError:
+    pl = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Konfiguracja logowania
 logging.basicConfig(
@@ -26,6 +38,105 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Metryki jakości raportowane pełnym zestawem statystyk
+TRACE_METRICS = ["relevance", "utilization", "adherence", "completeness"]
+RAGAS_METRICS = ["faithfulness", "answer_relevance", "context_precision", "context_recall"]
+
+# Tabele porównawcze: Parquet (wymaga pyarrow), CSV dodatkowo przy REPORT_CSV lub bez pyarrow
+PARQUET_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
+WRITE_CSV = os.getenv("REPORT_CSV", "").lower() in ("1", "true", "yes") or not PARQUET_AVAILABLE
+
+# Kolumny operacyjne: kolumna -> (klucz w statystykach, raportowane statystyki)
+OPERATIONAL_STATS = {
+    "total_time": ("latency", ["mean", "std", "p50", "p95"]),
+    "tokens_used": ("tokens", ["mean", "std", "min", "max"]),
+    "cost": ("cost", ["mean", "std", "min", "max"]),
+}
+
+
+@lru_cache(maxsize=32)
+def _load_results_file(path: str, mtime: float) -> Dict[str, pd.DataFrame]:
+    """
+    Ładuje plik wyników i dzieli go według polityk
+
+    Wynik jest zapamiętywany dla pary (ścieżka, mtime), więc zmodyfikowany
+    plik jest wczytywany ponownie. Zwracane DataFrame są współdzielone
+    i nie powinny być modyfikowane w miejscu.
+    """
+    logger.info(f"Ładowanie wyników z {path}")
+
+    if pl is not None:
+        # Polars: wielowątkowe parsowanie CSV i podział według polityk w jednym przejściu
+        parts = pl.read_csv(path, infer_schema_length=None).partition_by(
+            "policy", as_dict=True, maintain_order=True
+        )
+        parts = {(key[0] if isinstance(key, tuple) else key): part for key, part in parts.items()}
+        # Wspólny typ kategoryczny - ramki polityk łączą się bez utraty kategorii
+        policy_dtype = pd.CategoricalDtype(list(parts))
+        return {
+            policy: part.to_pandas().astype({"policy": policy_dtype})
+            for policy, part in parts.items()
+        }
+
+    df = pd.read_csv(path)
+    # Polityka jako kategoria - grupowanie i porównania na kodach całkowitych
+    df['policy'] = df['policy'].astype('category')
+
+    # Podziel według polityk - jedno grupowanie zamiast maski i kopii dla każdej polityki
+    return {
+        policy: policy_df
+        for policy, policy_df in df.groupby('policy', observed=True, sort=False)
+    }
+
+
+@lru_cache(maxsize=None)
+def _mpl():
+    """
+    Leniwie importuje i konfiguruje matplotlib oraz seaborn
+
+    Biblioteki wykresów ładowane są dopiero przy pierwszym wykresie w procesie,
+    więc CLI i użycie samych statystyk nie płacą kosztu ich importu.
+
+    Returns:
+        Krotka (pyplot, seaborn)
+    """
+    import matplotlib
+    matplotlib.use('Agg')  # Renderowanie bez GUI - bezpieczne w procesach roboczych
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    # Konfiguracja stylów
+    plt.style.use('seaborn-v0_8')
+    sns.set_palette("husl")
+    # Jawna czcionka dołączana do matplotlib - bez wyszukiwania zamienników
+    plt.rcParams['font.family'] = 'DejaVu Sans'
+
+    return plt, sns
+
+
+def _write_json_report(path: Path, report: Dict[str, Any]):
+    """Zapisuje raport jako JSON - tabela porównawcza (DataFrame) trafia do osobnego pliku"""
+    serializable = {key: value for key, value in report.items() if key != "comparison_table"}
+    
+    if orjson is not None:
+        # orjson: serializacja w C z natywną obsługą typów numpy
+        path.write_bytes(orjson.dumps(
+            serializable, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY
+        ))
+        return
+    
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(serializable, f, indent=2, ensure_ascii=False)
+
+
+def _stat_selector(key: str, field: str) -> Callable[[Dict[str, Any]], Optional[float]]:
+    """Zwraca funkcję wybierającą statystykę ze statystyk polityki (None gdy brak)"""
+    def select(policy_stats: Dict[str, Any]) -> Optional[float]:
+        if key not in policy_stats:
+            return None
+        return policy_stats[key][field]
+    return select
+
 
 class ReportGenerator:
     """Generator raportów porównawczych"""
@@ -35,9 +146,11 @@ class ReportGenerator:
         self.reports_dir = Path(__file__).parent / "reports"
         self.reports_dir.mkdir(exist_ok=True)
         
-        # Konfiguracja stylów
-        plt.style.use('seaborn-v0_8')
-        sns.set_palette("husl")
+        # Rozdzielczość wykresów (REPORT_DPI=300 dla wersji do publikacji)
+        self.dpi = int(os.getenv("REPORT_DPI", "150"))
+        
+        # Statystyki polityk per plik wyników: (ścieżka, mtime) -> {polityka: statystyki}
+        self._stats_cache: Dict[tuple, Dict[str, Any]] = {}
         
     def load_results(self, domain: str) -> Dict[str, pd.DataFrame]:
         """
@@ -49,27 +162,29 @@ class ReportGenerator:
         Returns:
             Słownik z DataFrame dla każdej polityki
         """
-        results = {}
+        _, results = self._load_domain_results(domain)
+        return results
+    
+    def _load_domain_results(self, domain: str) -> Tuple[Optional[tuple], Dict[str, pd.DataFrame]]:
+        """Zwraca klucz pamięci podręcznej (ścieżka, mtime) i wyniki najnowszego pliku domeny"""
+        cache_key = self._results_cache_key(domain)
+        if cache_key is None:
+            return None, {}
         
+        return cache_key, dict(_load_results_file(*cache_key))
+    
+    def _results_cache_key(self, domain: str) -> Optional[tuple]:
+        """Zwraca (ścieżka, mtime) najnowszego pliku wyników domeny lub None"""
         # Znajdź pliki wyników dla danej domeny
         csv_files = list(self.results_dir.glob(f"{domain}_results_*.csv"))
         
         if not csv_files:
             logger.error(f"Brak plików wyników dla domeny {domain}")
-            return {}
+            return None
         
-        # Załaduj najnowszy plik
+        # Najnowszy plik
         latest_file = max(csv_files, key=lambda x: x.stat().st_mtime)
-        logger.info(f"Ładowanie wyników z {latest_file}")
-        
-        df = pd.read_csv(latest_file)
-        
-        # Podziel według polityk
-        for policy in df['policy'].unique():
-            policy_df = df[df['policy'] == policy].copy()
-            results[policy] = policy_df
-        
-        return results
+        return str(latest_file), latest_file.stat().st_mtime
     
     def generate_domain_report(self, domain: str) -> Dict[str, Any]:
         """
@@ -84,16 +199,18 @@ class ReportGenerator:
         logger.info(f"Generowanie raportu dla domeny {domain}")
         
         # Załaduj wyniki
-        results = self.load_results(domain)
+        cache_key, results = self._load_domain_results(domain)
         if not results:
             return {}
         
-        # Oblicz statystyki dla każdej polityki
-        domain_stats = {}
-        
-        for policy, df in results.items():
-            stats = self._calculate_policy_stats(df)
-            domain_stats[policy] = stats
+        # Oblicz statystyki dla każdej polityki (raz na wersję pliku wyników)
+        domain_stats = self._stats_cache.get(cache_key)
+        if domain_stats is None:
+            domain_stats = {
+                policy: self._calculate_policy_stats(df)
+                for policy, df in results.items()
+            }
+            self._stats_cache[cache_key] = domain_stats
         
         # Generuj wykresy
         self._generate_domain_plots(domain, results)
@@ -121,61 +238,42 @@ class ReportGenerator:
         """Oblicza statystyki dla polityki"""
         stats = {}
         
-        # Metryki TRACe
-        trace_metrics = ["relevance", "utilization", "adherence", "completeness"]
-        for metric in trace_metrics:
-            if metric in df.columns:
-                values = df[metric].dropna()
-                stats[metric] = {
-                    "mean": values.mean(),
-                    "std": values.std(),
-                    "min": values.min(),
-                    "max": values.max(),
-                    "p50": values.median(),
-                    "p95": values.quantile(0.95)
-                }
-        
-        # Metryki RAGAS
-        ragas_metrics = ["faithfulness", "answer_relevance", "context_precision", "context_recall"]
-        for metric in ragas_metrics:
-            if metric in df.columns:
-                values = df[metric].dropna()
-                stats[metric] = {
-                    "mean": values.mean(),
-                    "std": values.std(),
-                    "min": values.min(),
-                    "max": values.max(),
-                    "p50": values.median(),
-                    "p95": values.quantile(0.95)
+        score_columns = [metric for metric in TRACE_METRICS + RAGAS_METRICS if metric in df.columns]
+        operational_columns = [column for column in OPERATIONAL_STATS if column in df.columns]
+        columns = score_columns + operational_columns
+        
+        if columns:
+            # Redukcje po osiach jednej macierzy float64 (wiersze x kolumny), NaN pomijane
+            values = df[columns].to_numpy(dtype=np.float64)
+            with warnings.catch_warnings():
+                # Kolumny bez wartości dają NaN, tak jak w pandas
+                warnings.simplefilter("ignore", RuntimeWarning)
+                mean = np.nanmean(values, axis=0)
+                std = np.nanstd(values, axis=0, ddof=1)
+                minimum = np.nanmin(values, axis=0)
+                maximum = np.nanmax(values, axis=0)
+                p50, p95 = np.nanpercentile(values, [50, 95], axis=0)
+            
+            summaries = {
+                column: {
+                    "mean": mean[i],
+                    "std": std[i],
+                    "min": minimum[i],
+                    "max": maximum[i],
+                    "p50": p50[i],
+                    "p95": p95[i]
                 }
-        
-        # Metryki operacyjne
-        if "total_time" in df.columns:
-            times = df["total_time"].dropna()
-            stats["latency"] = {
-                "mean": times.mean(),
-                "std": times.std(),
-                "p50": times.median(),
-                "p95": times.quantile(0.95)
-            }
-        
-        if "tokens_used" in df.columns:
-            tokens = df["tokens_used"].dropna()
-            stats["tokens"] = {
-                "mean": tokens.mean(),
-                "std": tokens.std(),
-                "min": tokens.min(),
-                "max": tokens.max()
-            }
-        
-        if "cost" in df.columns:
-            costs = df["cost"].dropna()
-            stats["cost"] = {
-                "mean": costs.mean(),
-                "std": costs.std(),
-                "min": costs.min(),
-                "max": costs.max()
+                for i, column in enumerate(columns)
             }
+            
+            # Metryki TRACe i RAGAS
+            for metric in score_columns:
+                stats[metric] = summaries[metric]
+            
+            # Metryki operacyjne
+            for column in operational_columns:
+                name, fields = OPERATIONAL_STATS[column]
+                stats[name] = {field: summaries[column][field] for field in fields}
         
         # Liczba zapytań
         stats["total_queries"] = len(df)
@@ -184,25 +282,52 @@ class ReportGenerator:
     
     def _generate_domain_plots(self, domain: str, results: Dict[str, pd.DataFrame]):
         """Generuje wykresy dla domeny"""
+        # Wszystkie polityki w jednej ramce - grupowanie wykonywane raz dla wszystkich wykresów
+        combined = pd.concat(list(results.values()), ignore_index=True)
+        groups = combined.groupby('policy', observed=True, sort=False)
         
-        # Wykres 1: Porównanie metryk TRACe
-        self._plot_trace_metrics(domain, results)
+        plt, _ = _mpl()
         
-        # Wykres 2: Porównanie metryk RAGAS
-        self._plot_ragas_metrics(domain, results)
+        # Jedna figura współdzielona przez wszystkie wykresy - każdy ją czyści i zapisuje
+        fig = plt.figure()
         
-        # Wykres 3: Porównanie latencji
-        self._plot_latency_comparison(domain, results)
+        try:
+            # Wykres 1: Porównanie metryk TRACe
+            self._plot_trace_metrics(fig, domain, groups)
+            
+            # Wykres 2: Porównanie metryk RAGAS
+            self._plot_ragas_metrics(fig, domain, groups)
+            
+            # Wykres 3: Porównanie latencji
+            self._plot_latency_comparison(fig, domain, groups)
+            
+            # Wykres 4: Porównanie kosztów
+            self._plot_cost_comparison(fig, domain, groups)
+            
+            # Wykres 5: Heatmapa korelacji
+            self._plot_correlation_heatmap(fig, domain, combined)
+        finally:
+            plt.close(fig)
+    
+    @staticmethod
+    def _policy_samples(groups, column: str):
+        """Zwraca wartości kolumny (bez NaN) i etykiety dla każdej polityki"""
+        if column not in groups.obj.columns:
+            return [], []
         
-        # Wykres 4: Porównanie kosztów
-        self._plot_cost_comparison(domain, results)
+        data = []
+        labels = []
+        for policy, values in groups[column]:
+            data.append(values.dropna().to_numpy())
+            labels.append(policy)
         
-        # Wykres 5: Heatmapa korelacji
-        self._plot_correlation_heatmap(domain, results)
+        return data, labels
     
-    def _plot_trace_metrics(self, domain: str, results: Dict[str, pd.DataFrame]):
+    def _plot_trace_metrics(self, fig: "Figure", domain: str, groups):
         """Wykres metryk TRACe"""
-        fig, axes = plt.subplots(2, 2, figsize=(15, 12))
+        fig.clear()
+        fig.set_size_inches(15, 12)
+        axes = fig.subplots(2, 2)
         fig.suptitle(f'TRACe Metrics Comparison - {domain}', fontsize=16)
         
         metrics = ["relevance", "utilization", "adherence", "completeness"]
@@ -211,14 +336,7 @@ class ReportGenerator:
         for i, (metric, title) in enumerate(zip(metrics, titles)):
             ax = axes[i//2, i%2]
             
-            data = []
-            labels = []
-            
-            for policy, df in results.items():
-                if metric in df.columns:
-                    values = df[metric].dropna()
-                    data.append(values)
-                    labels.append(policy)
+            data, labels = self._policy_samples(groups, metric)
             
             if data:
                 ax.boxplot(data, labels=labels)
@@ -226,13 +344,14 @@ class ReportGenerator:
                 ax.set_ylabel('Score')
                 ax.tick_params(axis='x', rotation=45)
         
-        plt.tight_layout()
-        plt.savefig(self.reports_dir / f"{domain}_trace_metrics.png", dpi=300, bbox_inches='tight')
-        plt.close()
+        fig.tight_layout()
+        fig.savefig(self.reports_dir / f"{domain}_trace_metrics.png", dpi=self.dpi)
     
-    def _plot_ragas_metrics(self, domain: str, results: Dict[str, pd.DataFrame]):
+    def _plot_ragas_metrics(self, fig: "Figure", domain: str, groups):
         """Wykres metryk RAGAS"""
-        fig, axes = plt.subplots(2, 2, figsize=(15, 12))
+        fig.clear()
+        fig.set_size_inches(15, 12)
+        axes = fig.subplots(2, 2)
         fig.suptitle(f'RAGAS Metrics Comparison - {domain}', fontsize=16)
         
         metrics = ["faithfulness", "answer_relevance", "context_precision", "context_recall"]
@@ -241,14 +360,7 @@ class ReportGenerator:
         for i, (metric, title) in enumerate(zip(metrics, titles)):
             ax = axes[i//2, i%2]
             
-            data = []
-            labels = []
-            
-            for policy, df in results.items():
-                if metric in df.columns:
-                    values = df[metric].dropna()
-                    data.append(values)
-                    labels.append(policy)
+            data, labels = self._policy_samples(groups, metric)
             
             if data:
                 ax.boxplot(data, labels=labels)
@@ -256,22 +368,16 @@ class ReportGenerator:
                 ax.set_ylabel('Score')
                 ax.tick_params(axis='x', rotation=45)
         
-        plt.tight_layout()
-        plt.savefig(self.reports_dir / f"{domain}_ragas_metrics.png", dpi=300, bbox_inches='tight')
-        plt.close()
+        fig.tight_layout()
+        fig.savefig(self.reports_dir / f"{domain}_ragas_metrics.png", dpi=self.dpi)
     
-    def _plot_latency_comparison(self, domain: str, results: Dict[str, pd.DataFrame]):
+    def _plot_latency_comparison(self, fig: "Figure", domain: str, groups):
         """Wykres porównania latencji"""
-        fig, ax = plt.subplots(figsize=(12, 8))
+        fig.clear()
+        fig.set_size_inches(12, 8)
+        ax = fig.add_subplot()
         
-        data = []
-        labels = []
-        
-        for policy, df in results.items():
-            if "total_time" in df.columns:
-                times = df["total_time"].dropna()
-                data.append(times)
-                labels.append(policy)
+        data, labels = self._policy_samples(groups, "total_time")
         
         if data:
             ax.boxplot(data, labels=labels)
@@ -279,22 +385,16 @@ class ReportGenerator:
             ax.set_ylabel('Time (ms)')
             ax.tick_params(axis='x', rotation=45)
         
-        plt.tight_layout()
-        plt.savefig(self.reports_dir / f"{domain}_latency.png", dpi=300, bbox_inches='tight')
-        plt.close()
+        fig.tight_layout()
+        fig.savefig(self.reports_dir / f"{domain}_latency.png", dpi=self.dpi)
     
-    def _plot_cost_comparison(self, domain: str, results: Dict[str, pd.DataFrame]):
+    def _plot_cost_comparison(self, fig: "Figure", domain: str, groups):
         """Wykres porównania kosztów"""
-        fig, ax = plt.subplots(figsize=(12, 8))
+        fig.clear()
+        fig.set_size_inches(12, 8)
+        ax = fig.add_subplot()
         
-        data = []
-        labels = []
-        
-        for policy, df in results.items():
-            if "cost" in df.columns:
-                costs = df["cost"].dropna()
-                data.append(costs)
-                labels.append(policy)
+        data, labels = self._policy_samples(groups, "cost")
         
         if data:
             ax.boxplot(data, labels=labels)
@@ -302,37 +402,37 @@ class ReportGenerator:
             ax.set_ylabel('Cost ($)')
             ax.tick_params(axis='x', rotation=45)
         
-        plt.tight_layout()
-        plt.savefig(self.reports_dir / f"{domain}_cost.png", dpi=300, bbox_inches='tight')
-        plt.close()
+        fig.tight_layout()
+        fig.savefig(self.reports_dir / f"{domain}_cost.png", dpi=self.dpi)
     
-    def _plot_correlation_heatmap(self, domain: str, results: Dict[str, pd.DataFrame]):
+    def _plot_correlation_heatmap(self, fig: "Figure", domain: str, combined_df: pd.DataFrame):
         """Heatmapa korelacji metryk"""
-        # Połącz wszystkie dane
-        all_data = []
-        for policy, df in results.items():
-            df_copy = df.copy()
-            df_copy['policy'] = policy
-            all_data.append(df_copy)
-        
-        if not all_data:
+        if combined_df.empty:
             return
         
-        combined_df = pd.concat(all_data, ignore_index=True)
-        
         # Wybierz kolumny numeryczne
-        numeric_cols = combined_df.select_dtypes(include=[np.number]).columns
-        correlation_matrix = combined_df[numeric_cols].corr()
+        numeric_df = combined_df.select_dtypes(include=[np.number])
+        
+        if numeric_df.notna().all().all():
+            # Bez braków: jedno wywołanie np.corrcoef (float32) zamiast korelacji liczonych parami
+            with np.errstate(divide='ignore', invalid='ignore'):
+                correlation = np.corrcoef(numeric_df.to_numpy(dtype=np.float32), rowvar=False)
+            correlation_matrix = pd.DataFrame(correlation, index=numeric_df.columns, columns=numeric_df.columns)
+        else:
+            # Braki w danych: korelacje pandas liczone na kompletnych parach kolumn
+            correlation_matrix = numeric_df.corr()
         
         # Generuj heatmapę
-        fig, ax = plt.subplots(figsize=(12, 10))
+        fig.clear()
+        fig.set_size_inches(12, 10)
+        ax = fig.add_subplot()
+        _, sns = _mpl()
         sns.heatmap(correlation_matrix, annot=True, cmap='coolwarm', center=0,
                     square=True, ax=ax)
         ax.set_title(f'Metrics Correlation Heatmap - {domain}')
         
-        plt.tight_layout()
-        plt.savefig(self.reports_dir / f"{domain}_correlation.png", dpi=300, bbox_inches='tight')
-        plt.close()
+        fig.tight_layout()
+        fig.savefig(self.reports_dir / f"{domain}_correlation.png", dpi=self.dpi)
     
     def _generate_comparison_table(self, domain_stats: Dict[str, Dict[str, Any]]) -> pd.DataFrame:
         """Generuje tabelę porównawczą"""
@@ -374,22 +474,22 @@ class ReportGenerator:
         """Generuje wnioski dla domeny"""
         conclusions = []
         
-        # Znajdź najlepszą politykę dla każdej metryki
-        best_policies = {}
-        
-        for metric in ["relevance", "utilization", "adherence", "completeness"]:
-            best_policy = None
-            best_score = 0
-            
-            for policy, stats in domain_stats.items():
-                if metric in stats:
-                    score = stats[metric]["mean"]
-                    if score > best_score:
-                        best_score = score
-                        best_policy = policy
-            
-            if best_policy:
-                best_policies[metric] = best_policy
+        # Znajdź najlepszą politykę dla każdej metryki (polityki x metryki, średnie)
+        means = pd.DataFrame.from_dict(
+            {
+                policy: {metric: stats[metric]["mean"] for metric in TRACE_METRICS if metric in stats}
+                for policy, stats in domain_stats.items()
+            },
+            orient='index',
+            columns=TRACE_METRICS
+        ).dropna(axis=1, how='all')
+        
+        best_policies = means.idxmax(axis=0)
+        best_scores = means.max(axis=0)
+        
+        for metric, best_policy in best_policies.items():
+            best_score = best_scores[metric]
+            if best_score > 0:
                 conclusions.append(f"Polityka {best_policy} osiąga najlepszą {metric} ({best_score:.3f})")
         
         # Analiza latencji
@@ -416,16 +516,23 @@ class ReportGenerator:
         """Zapisuje raport domeny"""
         report_file = self.reports_dir / f"{domain}_report.json"
         
-        with open(report_file, 'w', encoding='utf-8') as f:
-            json.dump(report, f, indent=2, ensure_ascii=False)
+        _write_json_report(report_file, report)
         
         # Zapisz tabelę porównawczą
         if "comparison_table" in report:
-            table_file = self.reports_dir / f"{domain}_comparison.csv"
-            report["comparison_table"].to_csv(table_file, index=False)
+            self._save_comparison_table(report["comparison_table"], f"{domain}_comparison")
         
         logger.info(f"Raport domeny {domain} zapisany do {report_file}")
     
+    def _save_comparison_table(self, table: pd.DataFrame, name: str):
+        """Zapisuje tabelę porównawczą jako Parquet i/lub CSV"""
+        if PARQUET_AVAILABLE:
+            table.to_parquet(self.reports_dir / f"{name}.parquet", engine='pyarrow',
+                             compression='snappy', index=False)
+        
+        if WRITE_CSV:
+            table.to_csv(self.reports_dir / f"{name}.csv", index=False)
+    
     def generate_combined_report(self, domains: List[str]) -> Dict[str, Any]:
         """
         Generuje zbiorczy raport dla wszystkich domen
@@ -441,9 +548,27 @@ class ReportGenerator:
         combined_stats = {}
         all_comparisons = []
         
+        # Raporty domen są niezależne - przy wielu domenach generuj je w osobnych procesach
+        if len(domains) > 1:
+            workers = min(len(domains), os.cpu_count() or 1)
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                # Procesy robocze dostają znane statystyki i zwracają je uzupełnione
+                worker_results = list(executor.map(
+                    _domain_worker,
+                    [self.results_dir] * len(domains),
+                    [self.reports_dir] * len(domains),
+                    domains,
+                    [self._stats_cache] * len(domains)
+                ))
+            domain_reports = []
+            for domain_report, stats_cache in worker_results:
+                self._stats_cache.update(stats_cache)
+                domain_reports.append(domain_report)
+        else:
+            domain_reports = [self.generate_domain_report(domain) for domain in domains]
+        
         # Załaduj statystyki dla każdej domeny
-        for domain in domains:
-            domain_report = self.generate_domain_report(domain)
+        for domain, domain_report in zip(domains, domain_reports):
             if domain_report:
                 combined_stats[domain] = domain_report["statistics"]
                 
@@ -481,113 +606,60 @@ class ReportGenerator:
         """Generuje wykresy zbiorcze"""
         
         # Wykres 1: Porównanie metryk TRACe między domenami
-        self._plot_domain_comparison(combined_stats, "relevance", "Relevance")
-        self._plot_domain_comparison(combined_stats, "adherence", "Adherence")
-        self._plot_domain_comparison(combined_stats, "utilization", "Utilization")
-        self._plot_domain_comparison(combined_stats, "completeness", "Completeness")
+        for metric, title in [("relevance", "Relevance"), ("adherence", "Adherence"),
+                              ("utilization", "Utilization"), ("completeness", "Completeness")]:
+            self._plot_grouped_bars(
+                combined_stats, _stat_selector(metric, "mean"), f'{title} Score',
+                f'{title} Comparison Across Domains', f"combined_{metric.lower()}_comparison.png"
+            )
         
         # Wykres 2: Porównanie latencji między domenami
-        self._plot_domain_latency_comparison(combined_stats)
+        self._plot_grouped_bars(
+            combined_stats, _stat_selector("latency", "p95"), 'Latency (ms)',
+            'Latency Comparison Across Domains', "combined_latency_comparison.png"
+        )
         
         # Wykres 3: Porównanie kosztów między domenami
-        self._plot_domain_cost_comparison(combined_stats)
+        self._plot_grouped_bars(
+            combined_stats, _stat_selector("cost", "mean"), 'Cost ($)',
+            'Cost Comparison Across Domains', "combined_cost_comparison.png"
+        )
     
-    def _plot_domain_comparison(self, combined_stats: Dict[str, Dict[str, Dict[str, Any]]], 
-                               metric: str, title: str):
-        """Wykres porównania metryki między domenami"""
-        fig, ax = plt.subplots(figsize=(12, 8))
-        
+    def _plot_grouped_bars(self, combined_stats: Dict[str, Dict[str, Dict[str, Any]]],
+                           selector: Callable[[Dict[str, Any]], Optional[float]],
+                           ylabel: str, title: str, filename: str):
+        """Wykres słupkowy wartości polityk pogrupowanych według domen"""
         domains = list(combined_stats.keys())
         policies = ["text", "facts", "graph", "hybrid"]
         
-        x = np.arange(len(domains))
-        width = 0.2
-        
-        for i, policy in enumerate(policies):
-            values = []
-            for domain in domains:
-                if policy in combined_stats[domain] and metric in combined_stats[domain][policy]:
-                    values.append(combined_stats[domain][policy][metric]["mean"])
-                else:
-                    values.append(0)
-            
-            ax.bar(x + i * width, values, width, label=policy)
-        
-        ax.set_xlabel('Domain')
-        ax.set_ylabel(f'{title} Score')
-        ax.set_title(f'{title} Comparison Across Domains')
-        ax.set_xticks(x + width * 1.5)
-        ax.set_xticklabels(domains)
-        ax.legend()
-        
-        plt.tight_layout()
-        plt.savefig(self.reports_dir / f"combined_{metric.lower()}_comparison.png", 
-                   dpi=300, bbox_inches='tight')
-        plt.close()
-    
-    def _plot_domain_latency_comparison(self, combined_stats: Dict[str, Dict[str, Dict[str, Any]]]):
-        """Wykres porównania latencji między domenami"""
-        fig, ax = plt.subplots(figsize=(12, 8))
-        
-        domains = list(combined_stats.keys())
-        policies = ["text", "facts", "graph", "hybrid"]
+        # Macierz polityki x domeny; brak statystyki rysowany jako 0
+        values = np.zeros((len(policies), len(domains)))
+        for j, domain in enumerate(domains):
+            for i, policy in enumerate(policies):
+                if policy in combined_stats[domain]:
+                    value = selector(combined_stats[domain][policy])
+                    if value is not None:
+                        values[i, j] = value
         
         x = np.arange(len(domains))
         width = 0.2
         
-        for i, policy in enumerate(policies):
-            values = []
-            for domain in domains:
-                if policy in combined_stats[domain] and "latency" in combined_stats[domain][policy]:
-                    values.append(combined_stats[domain][policy]["latency"]["p95"])
-                else:
-                    values.append(0)
-            
-            ax.bar(x + i * width, values, width, label=policy)
-        
-        ax.set_xlabel('Domain')
-        ax.set_ylabel('Latency (ms)')
-        ax.set_title('Latency Comparison Across Domains')
-        ax.set_xticks(x + width * 1.5)
-        ax.set_xticklabels(domains)
-        ax.legend()
-        
-        plt.tight_layout()
-        plt.savefig(self.reports_dir / "combined_latency_comparison.png", 
-                   dpi=300, bbox_inches='tight')
-        plt.close()
-    
-    def _plot_domain_cost_comparison(self, combined_stats: Dict[str, Dict[str, Dict[str, Any]]]):
-        """Wykres porównania kosztów między domenami"""
+        plt, _ = _mpl()
         fig, ax = plt.subplots(figsize=(12, 8))
         
-        domains = list(combined_stats.keys())
-        policies = ["text", "facts", "graph", "hybrid"]
-        
-        x = np.arange(len(domains))
-        width = 0.2
-        
         for i, policy in enumerate(policies):
-            values = []
-            for domain in domains:
-                if policy in combined_stats[domain] and "cost" in combined_stats[domain][policy]:
-                    values.append(combined_stats[domain][policy]["cost"]["mean"])
-                else:
-                    values.append(0)
-            
-            ax.bar(x + i * width, values, width, label=policy)
+            ax.bar(x + i * width, values[i], width, label=policy)
         
         ax.set_xlabel('Domain')
-        ax.set_ylabel('Cost ($)')
-        ax.set_title('Cost Comparison Across Domains')
+        ax.set_ylabel(ylabel)
+        ax.set_title(title)
         ax.set_xticks(x + width * 1.5)
         ax.set_xticklabels(domains)
         ax.legend()
         
-        plt.tight_layout()
-        plt.savefig(self.reports_dir / "combined_cost_comparison.png", 
-                   dpi=300, bbox_inches='tight')
-        plt.close()
+        fig.tight_layout()
+        fig.savefig(self.reports_dir / filename, dpi=self.dpi)
+        plt.close(fig)
     
     def _generate_combined_conclusions(self, combined_stats: Dict[str, Dict[str, Dict[str, Any]]]) -> List[str]:
         """Generuje wnioski zbiorcze"""
@@ -622,30 +694,37 @@ class ReportGenerator:
             conclusions.append(f"Polityka {best_overall_policy} wygrywa w {policy_wins[best_overall_policy]} domenach")
         
         # Analiza różnic między domenami
-        adherence_scores = []
-        for domain, stats in combined_stats.items():
-            for policy, policy_stats in stats.items():
-                if "adherence" in policy_stats:
-                    adherence_scores.append(policy_stats["adherence"]["mean"])
-        
-        if adherence_scores:
+        adherence_scores = np.fromiter(
+            (
+                policy_stats["adherence"]["mean"]
+                for stats in combined_stats.values()
+                for policy_stats in stats.values()
+                if "adherence" in policy_stats
+            ),
+            dtype=np.float64
+        )
+        
+        if adherence_scores.size:
             score_std = np.std(adherence_scores)
             conclusions.append(f"Odchylenie standardowe adherence: {score_std:.3f}")
         
         # Wnioski o wydajności
-        latency_analysis = []
-        for domain, stats in combined_stats.items():
-            for policy, policy_stats in stats.items():
-                if "latency" in policy_stats:
-                    latency_analysis.append({
-                        "domain": domain,
-                        "policy": policy,
-                        "p95": policy_stats["latency"]["p95"]
-                    })
-        
-        if latency_analysis:
-            fastest = min(latency_analysis, key=lambda x: x["p95"])
-            conclusions.append(f"Najszybsza polityka: {fastest['policy']} w domenie {fastest['domain']} ({fastest['p95']:.1f}ms)")
+        latency_labels = [
+            (domain, policy)
+            for domain, stats in combined_stats.items()
+            for policy, policy_stats in stats.items()
+            if "latency" in policy_stats
+        ]
+        
+        if latency_labels:
+            p95s = np.fromiter(
+                (combined_stats[domain][policy]["latency"]["p95"] for domain, policy in latency_labels),
+                dtype=np.float64,
+                count=len(latency_labels)
+            )
+            fastest_index = int(np.argmin(p95s))
+            fastest_domain, fastest_policy = latency_labels[fastest_index]
+            conclusions.append(f"Najszybsza polityka: {fastest_policy} w domenie {fastest_domain} ({p95s[fastest_index]:.1f}ms)")
         
         return conclusions
     
@@ -653,17 +732,30 @@ class ReportGenerator:
         """Zapisuje zbiorczy raport"""
         report_file = self.reports_dir / "combined_report.json"
         
-        with open(report_file, 'w', encoding='utf-8') as f:
-            json.dump(combined_report, f, indent=2, ensure_ascii=False)
+        _write_json_report(report_file, combined_report)
         
         # Zapisz tabelę porównawczą
         if "comparison_table" in combined_report and not combined_report["comparison_table"].empty:
-            table_file = self.reports_dir / "combined_comparison.csv"
-            combined_report["comparison_table"].to_csv(table_file, index=False)
+            self._save_comparison_table(combined_report["comparison_table"], "combined_comparison")
         
         logger.info(f"Zbiorczy raport zapisany do {report_file}")
 
 
+def _domain_worker(results_dir: Path, reports_dir: Path, domain: str,
+                   stats_cache: Dict[tuple, Dict[str, Any]]) -> Tuple[Dict[str, Any], Dict[tuple, Dict[str, Any]]]:
+    """
+    Generuje raport jednej domeny w procesie roboczym
+    
+    Returns:
+        Raport domeny i pamięć podręczna statystyk procesu (do scalenia w procesie głównym)
+    """
+    generator = ReportGenerator()
+    generator.results_dir = results_dir
+    generator.reports_dir = reports_dir
+    generator._stats_cache = stats_cache
+    return generator.generate_domain_report(domain), generator._stats_cache
+
+
 def main():
     """Główna funkcja"""
     if len(sys.argv) < 2:
@@ -62,6 +62,9 @@ class TrendAnalyzer:
         self.trend_data = []
         self.patterns = []
         
+        # Wyniki analyze_trends według (metryka, polityka, domena); czyszczone przy dodaniu danych
+        self._trend_cache: Dict[Tuple[str, Optional[str], Optional[str]], List[TrendAnalysis]] = {}
+        
         # Konfiguracja analizy
         self.trend_thresholds = {
             "strong_increase": 0.1,
@@ -80,6 +83,7 @@ class TrendAnalyzer:
         domain: str
     ):
         """Dodaje punkt danych do analizy"""
+        self._trend_cache.clear()
         self.trend_data.append(TrendPoint(
             timestamp=timestamp,
             metric=metric,
@@ -88,6 +92,21 @@ class TrendAnalyzer:
             domain=domain
         ))
     
+    def add_data_points(
+        self,
+        timestamps: List[datetime],
+        metric: str,
+        values: Any,
+        policy: str,
+        domain: str
+    ):
+        """Dodaje serię punktów jednej metryki (values: sekwencja lub tablica NumPy)"""
+        self._trend_cache.clear()
+        self.trend_data.extend(
+            TrendPoint(timestamp=timestamp, metric=metric, value=value, policy=policy, domain=domain)
+            for timestamp, value in zip(timestamps, np.asarray(values, dtype=float).tolist())
+        )
+    
     def analyze_trends(self, metric: str, policy: str = None, domain: str = None) -> List[TrendAnalysis]:
         """
         Analizuje trendy dla danej metryki
@@ -100,6 +119,13 @@ class TrendAnalyzer:
         Returns:
             Lista analiz trendów
         """
+        cache_key = (metric, policy, domain)
+        if cache_key not in self._trend_cache:
+            self._trend_cache[cache_key] = self._compute_trends(metric, policy, domain)
+        return list(self._trend_cache[cache_key])
+    
+    def _compute_trends(self, metric: str, policy: Optional[str], domain: Optional[str]) -> List[TrendAnalysis]:
+        """Wyznacza trendy metryki (bez pamięci podręcznej)"""
         # Filtruj dane
         filtered_data = [
             point for point in self.trend_data
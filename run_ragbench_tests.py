@@ -46,7 +46,8 @@ def run_tests():
                 sys.executable, "-m", "pytest", 
                 test_file, 
                 "-v", 
-                "--tb=short"
+                "--tb=short",
+                "-n", "auto"  # Testy są niezależne - uruchom równolegle (pytest-xdist)
             ], 
             cwd=backend_path,
             capture_output=True,